@@ -0,0 +1,72 @@
+# Database backend benchmark.
+#
+#   python -m benchmarks.db_bench --dumps 100 1000 10000
+#
+# Opens every DumpsDB backend on a fresh file and times startup and the per-cycle work of the checker:
+# the batched "which dumps are new" lookup, inserting the new ones and pruning the stale ones.
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("TEMP", tempfile.gettempdir())
+
+from dumps_db.factory import BACKENDS
+from scanner import Dump
+
+
+def synthetic_dumps(count, offset=0):
+    return [Dump(f"C:\\Logs\\AppHost_{i}.dmp", 1024 + i, 1600000000 + i, root="SERVER", dev=1, ino=i + 1)
+            for i in range(offset, offset + count)]
+
+
+def _timed(action, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def measure(backend, count, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dumps.db")
+        results = {"open": _timed(lambda: BACKENDS[backend](path), 1)}
+        database = BACKENDS[backend](path)
+
+        known = synthetic_dumps(count)
+        for dump in known:
+            database.insert(dump)
+
+        results["lookup (nothing new)"] = _timed(lambda: database.new_dumps(known), repeat)
+        fresh = synthetic_dumps(count, offset=count)
+        results["lookup (all new)"] = _timed(lambda: database.new_dumps(fresh), repeat)
+
+        def insert_fresh():
+            database.prune([dump.identity for dump in known])
+            for dump in fresh:
+                database.insert(dump)
+
+        results["insert"] = _timed(insert_fresh, repeat)
+        results["prune"] = _timed(lambda: database.prune([dump.identity for dump in known]), repeat)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare DumpsDB backends.")
+    parser.add_argument("--dumps", type=int, nargs="+", default=[100, 1000, 10000], help="dumps per cycle")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation, the median is reported")
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':<12} {'dumps':>7} {'operation':<22} {'ms':>10}")
+    for count in args.dumps:
+        for backend in args.backends:
+            for operation, milliseconds in measure(backend, count, args.repeat).items():
+                print(f"{backend:<12} {count:>7} {operation:<22} {milliseconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
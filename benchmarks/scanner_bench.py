@@ -0,0 +1,225 @@
+# Scanner benchmark on synthetic log trees.
+#
+#   python -m benchmarks.scanner_bench --files 1000 10000 100000 --depth 3 --dump-ratio 0.01
+#
+# Trees are generated on a tmpfs (/dev/shm when it exists) so the numbers show the scanner, not the disk.
+# Every scenario runs in its own process to report its own peak RSS. "fs calls" counts os.scandir, os.stat
+# and DirEntry.stat calls made during one cycle, each of them is at least one syscall.
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("TEMP", tempfile.gettempdir())
+
+from scanner import Dump, IncrementalScanner, scan_dumps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCENARIOS = ("full", "incremental-cold", "incremental-warm", "incremental-changed", "events")
+DEFAULT_FANOUT = 8
+
+
+def default_base_dir():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def generate_tree(base_dir, files, depth, dump_ratio, fanout=DEFAULT_FANOUT):
+    root = tempfile.mkdtemp(prefix=f"dumps_bench_{files}_", dir=base_dir)
+    directories = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"module_{i}") for parent in level for i in range(fanout)]
+        for directory in level:
+            os.mkdir(directory)
+        directories.extend(level)
+
+    dump_every = max(int(1 / dump_ratio), 1) if dump_ratio else 0
+    for i in range(files):
+        extension = ".dmp" if dump_every and i % dump_every == 0 else ".log"
+        open(os.path.join(directories[i % len(directories)], f"AppHost_{i}{extension}"), "w").close()
+
+    # Older than the racy-mtime window of the incremental scanner, as on a server that runs for a while.
+    past = time.time() - 3600
+    for directory in directories:
+        os.utime(directory, (past, past))
+    return root
+
+
+class FsCallCounter:
+    def __init__(self):
+        self.calls = 0
+        self._patched = []
+
+    def _count_os_calls(self, name):
+        original = getattr(os, name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return original(*args, **kwargs)
+
+        self._patched.append((name, original))
+        setattr(os, name, counted)
+
+    def __enter__(self):
+        self._count_os_calls("scandir")
+        self._count_os_calls("stat")
+        from_entry = self._from_entry = Dump.from_entry
+
+        def counted_from_entry(cls, entry, root=None):
+            self.calls += 1
+            return from_entry(entry, root=root)
+
+        Dump.from_entry = classmethod(counted_from_entry)
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, original in self._patched:
+            setattr(os, name, original)
+        Dump.from_entry = self._from_entry
+
+
+def _timed_cycles(cycle, repeat):
+    timings = []
+    calls = []
+    dumps = 0
+    for _ in range(repeat):
+        with FsCallCounter() as counter:
+            started = time.perf_counter()
+            dumps = len(cycle())
+            timings.append(time.perf_counter() - started)
+        calls.append(counter.calls)
+    return statistics.median(timings), statistics.median(calls), dumps
+
+
+def _event_latency(root, repeat):
+    from watcher.watcher import _DumpEventHandler, Observer
+
+    if Observer is None:
+        raise RuntimeError("package 'watchdog' is not installed")
+
+    appeared = threading.Event()
+    observer = Observer()
+    observer.schedule(_DumpEventHandler(lambda path: appeared.set()), root, recursive=True)
+    observer.start()
+    try:
+        timings = []
+        for i in range(repeat):
+            appeared.clear()
+            started = time.perf_counter()
+            open(os.path.join(root, f"bench_event_{i}.dmp"), "w").close()
+            if not appeared.wait(10):
+                raise RuntimeError("no event within 10s")
+            timings.append(time.perf_counter() - started)
+    finally:
+        observer.stop()
+        observer.join()
+    return statistics.median(timings), 0, repeat
+
+
+def run_scenario(root, scenario, repeat):
+    if scenario == "full":
+        result = _timed_cycles(lambda: scan_dumps(root), repeat)
+    elif scenario == "incremental-cold":
+        result = _timed_cycles(lambda: IncrementalScanner().scan(root), repeat)
+    elif scenario == "incremental-warm":
+        scanner = IncrementalScanner()
+        scanner.scan(root)
+        result = _timed_cycles(lambda: scanner.scan(root), repeat)
+    elif scenario == "incremental-changed":
+        scanner = IncrementalScanner()
+        scanner.scan(root)
+        changed = []
+
+        def cycle():
+            path = os.path.join(root, f"bench_changed_{len(changed)}.dmp")
+            open(path, "w").close()
+            changed.append(path)
+            return scanner.scan(root)
+
+        result = _timed_cycles(cycle, repeat)
+        for path in changed:
+            os.remove(path)
+        past = time.time() - 3600
+        os.utime(root, (past, past))
+    elif scenario == "events":
+        result = _event_latency(root, repeat)
+        for name in os.listdir(root):
+            if name.startswith("bench_event_"):
+                os.remove(os.path.join(root, name))
+    else:
+        raise ValueError(f"Unknown scenario '{scenario}'")
+
+    return result + (peak_rss_megabytes(),)
+
+
+def peak_rss_megabytes():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+    import psutil
+
+    return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def _scenario_process(root, scenario, repeat, queue):
+    try:
+        queue.put(run_scenario(root, scenario, repeat))
+    except Exception as er:
+        queue.put(er)
+
+
+def measure(root, scenario, repeat):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_scenario_process, args=(root, scenario, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dump scanners on synthetic log trees.")
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="number of files in each generated tree (up to 1000000)")
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 3], help="directory levels below the root")
+    parser.add_argument("--dump-ratio", type=float, nargs="+", default=[0.001, 0.01], help="fraction of *.dmp files")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help="subdirectories per directory")
+    parser.add_argument("--repeat", type=int, default=5, help="cycles per scenario, the median is reported")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--base-dir", default=default_base_dir(), help="where the trees are generated")
+    args = parser.parse_args(argv)
+
+    print(f"{'files':>8} {'depth':>5} {'dmp %':>6} {'scenario':<20} {'cycle ms':>10} {'files/s':>12} "
+          f"{'fs calls':>9} {'dumps':>6} {'peak RSS MB':>11}")
+    for files in args.files:
+        for depth in args.depth:
+            for dump_ratio in args.dump_ratio:
+                root = generate_tree(args.base_dir, files, depth, dump_ratio, fanout=args.fanout)
+                try:
+                    for scenario in args.scenarios:
+                        try:
+                            seconds, calls, dumps, peak_rss = measure(root, scenario, args.repeat)
+                        except Exception as er:
+                            print(f"{files:>8} {depth:>5} {dump_ratio * 100:>6.2f} {scenario:<20} failed: {er}")
+                            continue
+                        files_per_second = "-" if scenario == "events" else f"{files / seconds:.0f}"
+                        print(f"{files:>8} {depth:>5} {dump_ratio * 100:>6.2f} {scenario:<20} {seconds * 1000:>10.2f} "
+                              f"{files_per_second:>12} {calls:>9.0f} {dumps:>6} {peak_rss:>11.1f}")
+                finally:
+                    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
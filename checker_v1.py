@@ -7,38 +7,17 @@ import arrow
 from gmail import GMail, Message
 from tendo import singleton
 
+from scanner import Dump, scan_dumps
+
 
 class RecipientNotSetError(Exception):
     pass
 
 
-class Dump:
-    def __init__(self, dump_full_path):
-        assert dump_full_path.endswith(".dmp"), "Received file has extension different then '.dmp'"
-        self._dump = dump_full_path
-
-    @property
-    def file_name(self):
-        return os.path.split(self._dump)[-1]
-
-    @property
-    def full_path(self):
-        return self._dump
-
-
 def dumps_in_logs(logs_dir):
-    def search_dumps(log_path):
-        dumps = []
-        cwd, _, logs = next(os.walk(log_path))
-        for log_file in logs:
-            name, extension = os.path.splitext(log_file)
-            if extension == ".dmp":
-                dump = Dump(os.path.join(cwd, log_file))
-                dumps.append(dump)
-        return dumps
-
     servers_logs_dir = logs_dir["SERVER"]
-    return search_dumps(servers_logs_dir)
+    # One level only: the storing directory sits inside the logs directory.
+    return scan_dumps(servers_logs_dir, max_depth=0)
 
 
 def send_email(mail_configs: dict, dumps: [Dump]):
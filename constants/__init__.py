@@ -1 +1 @@
-from .constants import PathOf, UTILITY_REG_KEY, EMAIL_RE
+from .constants import PathOf, UTILITY_REG_KEY, EMAIL_RE, DUMP_EXTENSION
@@ -1 +1,5 @@
 from .db import DumpsDB
+from .sqlite_db import SQLiteDumpsDB
+from .factory import create_database
+from .cache import CachedDumpsDB, BloomFilter
+from .retention import apply_retention
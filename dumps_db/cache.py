@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import math
+
+logger = logging.getLogger("DumpChecker")
+
+DEFAULT_EXACT_LIMIT = 100000
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class CachedDumpsDB:
+    # Write-through cache of notified identities in front of a DumpsDB backend, loaded once at startup.
+    # Up to exact_limit identities it's a set and answers alone, so a cycle without new dumps costs no query.
+    # Past that it becomes a Bloom filter: a miss is still definitive, a possible hit is confirmed by SQLite.
+    def __init__(self, database, exact_limit=DEFAULT_EXACT_LIMIT, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        self.database = database
+        self.exact_limit = exact_limit
+        self.false_positive_rate = false_positive_rate
+        self._load()
+
+    def _load(self, capacity=None):
+        identities = set(self.database.notified_identities())
+        if capacity is None and len(identities) <= self.exact_limit:
+            self._seen = identities
+        else:
+            self._seen = BloomFilter(capacity or 2 * len(identities), self.false_positive_rate)
+            for identity in identities:
+                self._seen.add(identity)
+        logger.info(f"Dump cache loaded {len(identities)} identities ({type(self._seen).__name__}).")
+
+    @property
+    def exact(self):
+        return isinstance(self._seen, set)
+
+    def _remember(self, identity):
+        if self.exact:
+            self._seen.add(identity)
+            if len(self._seen) > self.exact_limit:
+                self._load(capacity=2 * len(self._seen))
+        else:
+            self._seen.add(identity)
+            if self._seen.count > self._seen.capacity:
+                self._load(capacity=2 * self._seen.count)
+
+    def check_exist(self, dump):
+        return not self.new_dumps([dump])
+
+    def new_dumps(self, dumps):
+        cached, missed = [], []
+        for dump in dumps:
+            (cached if dump.identity in self._seen else missed).append(dump)
+
+        new_identities = {dump.identity for dump in missed}
+        if missed and self.database.has_legacy_rows:
+            # Legacy rows are known by name only, the backend adopts them.
+            new_identities = {dump.identity for dump in self.database.new_dumps(missed)}
+            for dump in missed:
+                if dump.identity not in new_identities:
+                    self._remember(dump.identity)
+        if cached and not self.exact:
+            new_identities.update(dump.identity for dump in self.database.new_dumps(cached))
+        return [dump for dump in dumps if dump.identity in new_identities]
+
+    def record_detected(self, dumps):
+        self.database.record_detected(dumps)
+
+    def insert(self, dump):
+        self.database.insert(dump)
+        self._remember(dump.identity)
+
+    def insert_many(self, dumps):
+        self.database.insert_many(dumps)
+        for dump in dumps:
+            self._remember(dump.identity)
+
+    def delete(self, identity):
+        self.database.delete(identity)
+        if self.exact:
+            self._seen.discard(identity)
+
+    def prune(self, keep_identities, keep_names=()):
+        return self.database.prune(keep_identities, keep_names=keep_names)
+
+    def history(self, since=None, limit=100):
+        return self.database.history(since=since, limit=limit)
+
+    def crash_stats(self, by="day", since=None):
+        return self.database.crash_stats(by=by, since=since)
+
+    @property
+    def all_values(self):
+        return self.database.all_values
+
+    def close(self):
+        self.database.close()
@@ -1,39 +1,211 @@
 import sqlalchemy
 import os
+import time
 
-from sqlalchemy.orm import sessionmaker
+from .schema import TABLE, HISTORY_COLUMNS, STATS_TABLE, STATS_INSERT, STATS_UPDATE, STATS_KEYS, HistoryRecord, \
+    CrashStats, ensure_incremental_vacuum, stats_day, stats_values, upgrade
+
+DB_PATH = os.path.join(os.environ["TEMP"], "dumps.db")
+
+# Stays below SQLITE_MAX_VARIABLE_NUMBER of old SQLite builds (999).
+LOOKUP_CHUNK_SIZE = 500
+
+_COLUMN_TYPES = {"VARCHAR": sqlalchemy.String, "INTEGER": sqlalchemy.Integer, "FLOAT": sqlalchemy.Float}
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _history_values(dump, now):
+    return {"dump": dump.file_name, "identity": dump.identity, "root": dump.root, "path": dump.full_path,
+            "size": dump.size, "mtime": dump.mtime, "hash": dump.content_hash, "first_seen": now}
 
 
 class DumpsDB:
-    __tablename__ = 'Dumps'
+    __tablename__ = TABLE
 
-    def __init__(self):
-        self.engine = sqlalchemy.create_engine(f"sqlite:///{os.environ['TEMP']}/dumps.db")
+    def __init__(self, path=DB_PATH):
+        self.engine = sqlalchemy.create_engine(f"sqlite:///{path}")
         self.connection = self.engine.connect()
 
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
         metadata = sqlalchemy.MetaData()
 
-        self.dumps_table = sqlalchemy.Table('Dumps',
+        self.dumps_table = sqlalchemy.Table(self.__tablename__,
                                             metadata,
-                                            sqlalchemy.Column('dump', sqlalchemy.String(60), nullable=False, unique=True)
+                                            sqlalchemy.Column('dump', sqlalchemy.String, nullable=False),
+                                            sqlalchemy.Column('identity', sqlalchemy.String, nullable=True),
+                                            *[sqlalchemy.Column(name, _COLUMN_TYPES[column_type], nullable=True)
+                                              for name, column_type in HISTORY_COLUMNS]
                                             )
 
-        metadata.create_all(self.engine)
+        ensure_incremental_vacuum(self.connection.execute)
+        with self.connection.begin():
+            upgrade(self.connection.execute, time.time())
+        self._legacy_rows = self.connection.execute(
+            sqlalchemy.select([sqlalchemy.func.count()]).where(self.dumps_table.columns.identity.is_(None))).scalar()
+
+    @property
+    def has_legacy_rows(self):
+        return self._legacy_rows > 0
+
+    def notified_identities(self):
+        table = self.dumps_table
+        query = sqlalchemy.select([table.columns.identity]).where(table.columns.identity.isnot(None)) \
+            .where(table.columns.notified_at.isnot(None))
+        return (row.identity for row in self.connection.execute(query))
 
     def check_exist(self, dump):
-        return self.connection.execute(sqlalchemy.select([self.dumps_table]).where(self.dumps_table.columns.dump == dump)).fetchall()
+        return not self.new_dumps([dump])
+
+    def new_dumps(self, dumps):
+        # Answers "which of these dumps weren't reported yet" with one indexed IN query per chunk of identities
+        # instead of a SELECT per dump.
+        table = self.dumps_table
+        identities = list({dump.identity for dump in dumps})
+        known = set()
+        for chunk in _chunks(identities):
+            query = sqlalchemy.select([table.columns.identity]).where(table.columns.identity.in_(chunk)) \
+                .where(table.columns.notified_at.isnot(None))
+            known.update(row.identity for row in self.connection.execute(query))
 
-    def insert(self, dump_name):
-        query = sqlalchemy.insert(self.dumps_table)
-        self.connection.execute(query, [{"dump": dump_name}])
+        new = [dump for dump in dumps if dump.identity not in known]
+        if self._legacy_rows and new:
+            adopted = self._adopt_legacy(new)
+            new = [dump for dump in new if dump.identity not in adopted]
+        return new
 
-    def delete(self, dump_name):
-        query = sqlalchemy.delete(self.dumps_table)
-        self.connection.execute(query, [{"dump": dump_name}])
+    def _adopt_legacy(self, dumps):
+        table = self.dumps_table
+        by_name = {}
+        for dump in dumps:
+            by_name.setdefault(dump.file_name, dump)
+
+        adopted = set()
+        with self.connection.begin():
+            for chunk in _chunks(list(by_name)):
+                query = sqlalchemy.select([table.columns.dump]).where(table.columns.identity.is_(None)).where(table.columns.dump.in_(chunk))
+                for row in self.connection.execute(query).fetchall():
+                    dump = by_name[row.dump]
+                    # A row recorded when the dump was detected would collide with the adopted identity.
+                    self.connection.execute(sqlalchemy.delete(table).where(table.columns.identity == dump.identity))
+                    values = _history_values(dump, None)
+                    del values["first_seen"]
+                    self.connection.execute(sqlalchemy.update(table)
+                                            .where(table.columns.identity.is_(None))
+                                            .where(table.columns.dump == row.dump)
+                                            .values(**values))
+                    adopted.add(dump.identity)
+        self._legacy_rows -= len(adopted)
+        return adopted
+
+    def record_detected(self, dumps):
+        # Keeps the time a dump was found for the first time, the row counts as reported only once notified.
+        now = time.time()
+        query = sqlalchemy.insert(self.dumps_table).prefix_with("OR IGNORE")
+        with self.connection.begin():
+            for dump in dumps:
+                self.connection.execute(query, [_history_values(dump, now)])
+
+    def insert(self, dump):
+        self.insert_many([dump])
+
+    def insert_many(self, dumps):
+        # One transaction, so one commit and one fsync, for the whole group.
+        now = time.time()
+        with self.connection.begin():
+            for dump in dumps:
+                self._insert(dump, now)
+
+    def _insert(self, dump, now):
+        table = self.dumps_table
+        values = {"removed_at": None}
+        if dump.content_hash is not None:
+            values["hash"] = dump.content_hash
+        if dump.archive_path is not None:
+            values["archive_path"] = dump.archive_path
+        self.connection.execute(sqlalchemy.insert(table).prefix_with("OR IGNORE"), [_history_values(dump, now)])
+        notified = self.connection.execute(sqlalchemy.update(table)
+                                           .where(table.columns.identity == dump.identity)
+                                           .where(table.columns.notified_at.is_(None))
+                                           .values(notified_at=now)).rowcount
+        self.connection.execute(sqlalchemy.update(table).where(table.columns.identity == dump.identity).values(**values))
+        if notified:
+            stats = stats_values(dump.file_name, dump.root, dump.size, dump.mtime)
+            self.connection.execute(sqlalchemy.text(STATS_INSERT), **stats)
+            self.connection.execute(sqlalchemy.text(STATS_UPDATE), **stats)
+
+    def delete(self, identity):
+        query = sqlalchemy.delete(self.dumps_table).where(self.dumps_table.columns.identity == identity)
+        self.connection.execute(query)
+
+    def prune(self, keep_identities, keep_names=()):
+        # Marks every live row whose identity isn't in keep_identities as gone from the logs with a single UPDATE
+        # in one transaction, the rows stay as history. Rows of kept dumps are live again: a dump missed by one
+        # cycle (a root that failed, a skipped directory) mustn't be left to the retention job. Large keep sets
+        # go through a temporary table to stay under the bind-parameter limit. Legacy rows are known by name
+        # only, they are marked gone when no kept dump has their name and are still adopted until retention
+        # deletes them.
+        table = self.dumps_table
+        keep_identities = list(set(keep_identities))
+        now = time.time()
+        with self.connection.begin():
+            removed = self._prune_legacy(set(keep_names), now) if self._legacy_rows else 0
+            if len(keep_identities) <= LOOKUP_CHUNK_SIZE:
+                if keep_identities:
+                    self.connection.execute(sqlalchemy.update(table).where(table.columns.removed_at.isnot(None))
+                                            .where(table.columns.identity.in_(keep_identities)).values(removed_at=None))
+                query = sqlalchemy.update(table).where(table.columns.removed_at.is_(None)) \
+                    .where(table.columns.identity.notin_(keep_identities)).values(removed_at=now)
+                return removed + self.connection.execute(query).rowcount
+
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS keep_identities (identity TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM keep_identities")
+            self.connection.execute(sqlalchemy.text("INSERT OR IGNORE INTO keep_identities (identity) VALUES (:identity)"),
+                                    [{"identity": identity} for identity in keep_identities])
+            self.connection.execute(f"UPDATE {self.__tablename__} SET removed_at = NULL WHERE removed_at IS NOT NULL "
+                                    f"AND identity IN (SELECT identity FROM keep_identities)")
+            removed += self.connection.execute(sqlalchemy.text(
+                f"UPDATE {self.__tablename__} SET removed_at = :now WHERE removed_at IS NULL AND identity NOT IN "
+                f"(SELECT identity FROM keep_identities)"), now=now).rowcount
+            self.connection.execute("DELETE FROM keep_identities")
+            return removed
+
+    def _prune_legacy(self, keep_names, now):
+        table = self.dumps_table
+        query = sqlalchemy.select([table.columns.dump]).where(table.columns.identity.is_(None)) \
+            .where(table.columns.removed_at.is_(None))
+        gone = [row.dump for row in self.connection.execute(query).fetchall() if row.dump not in keep_names]
+        removed = 0
+        for chunk in _chunks(gone):
+            removed += self.connection.execute(sqlalchemy.update(table).where(table.columns.identity.is_(None))
+                                               .where(table.columns.dump.in_(chunk)).values(removed_at=now)).rowcount
+        return removed
+
+    def history(self, since=None, limit=100):
+        table = self.dumps_table
+        query = sqlalchemy.select([table]).order_by(table.columns.first_seen.desc()).limit(limit)
+        if since is not None:
+            query = query.where(table.columns.first_seen >= since)
+        return [HistoryRecord(*row) for row in self.connection.execute(query)]
+
+    def crash_stats(self, by="day", since=None):
+        # Reads the counters kept by insert(), the history rows aren't scanned.
+        if by not in STATS_KEYS:
+            raise ValueError(f"Unknown crash stats key '{by}'.")
+        where = "" if since is None else "WHERE day >= :since"
+        query = sqlalchemy.text(f"SELECT {by}, sum(count), sum(size) FROM {STATS_TABLE} {where} GROUP BY {by} ORDER BY {by}")
+        parameters = {} if since is None else {"since": stats_day(since)}
+        return [CrashStats(*row) for row in self.connection.execute(query, **parameters)]
 
     @property
     def all_values(self):
-        return [item[0] for item in self.session.query(self.dumps_table).all()]
+        table = self.dumps_table
+        query = sqlalchemy.select([table.columns.identity]).where(table.columns.identity.isnot(None)) \
+            .where(table.columns.removed_at.is_(None))
+        return [row.identity for row in self.connection.execute(query)]
+
+    def close(self):
+        self.connection.close()
+        self.engine.dispose()
@@ -0,0 +1,29 @@
+import logging
+import time
+
+from .cache import CachedDumpsDB, DEFAULT_EXACT_LIMIT
+from .db import DumpsDB
+from .sqlite_db import SQLiteDumpsDB
+
+logger = logging.getLogger("DumpChecker")
+
+DEFAULT_BACKEND = "SQLALCHEMY"
+BACKENDS = {
+    "SQLALCHEMY": DumpsDB,
+    "SQLITE3": SQLiteDumpsDB,
+}
+
+
+def create_database(configs):
+    database_configs = configs.get("DATABASE", {})
+    backend = str(database_configs.get("BACKEND", DEFAULT_BACKEND)).upper()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown database backend '{backend}', use '{DEFAULT_BACKEND}'.")
+        backend = DEFAULT_BACKEND
+
+    started = time.perf_counter()
+    database = BACKENDS[backend]()
+    if database_configs.get("CACHE", True):
+        database = CachedDumpsDB(database, exact_limit=int(database_configs.get("CACHE_EXACT_LIMIT", DEFAULT_EXACT_LIMIT)))
+    logger.info(f"Database backend '{backend}' opened in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return database
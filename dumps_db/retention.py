@@ -0,0 +1,50 @@
+import logging
+import sqlite3
+import time
+
+from .db import DB_PATH
+from .schema import TABLE
+
+logger = logging.getLogger("DumpChecker")
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def apply_retention(path=DB_PATH, max_age_days=None, max_rows=None, batch_size=DEFAULT_BATCH_SIZE, pause=0.05):
+    # Deletes history of dumps that are already gone from the logs: older than max_age_days, or the oldest ones
+    # above max_rows. Rows of dumps still on disk are never touched, they keep the dumps from being reported
+    # again. Every batch is its own short transaction, so the checker isn't locked out for long, and the freed
+    # pages are given back to the file system by an incremental vacuum at the end.
+    connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+    try:
+        deleted = 0
+        batch = f"DELETE FROM {TABLE} WHERE rowid IN (SELECT rowid FROM {TABLE} WHERE removed_at IS NOT NULL {{}} " \
+                f"ORDER BY first_seen LIMIT ?)"
+
+        if max_age_days is not None:
+            oldest_allowed = time.time() - max_age_days * 24 * 60 * 60
+            while True:
+                count = connection.execute(batch.format("AND first_seen < ?"), (oldest_allowed, batch_size)).rowcount
+                deleted += count
+                if count < batch_size:
+                    break
+                time.sleep(pause)
+
+        if max_rows is not None:
+            while True:
+                excess = connection.execute(f"SELECT count(*) FROM {TABLE}").fetchone()[0] - max_rows
+                if excess <= 0:
+                    break
+                count = connection.execute(batch.format(""), (min(excess, batch_size),)).rowcount
+                deleted += count
+                if count == 0:
+                    break
+                time.sleep(pause)
+
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages:
+            connection.execute(f"PRAGMA incremental_vacuum({free_pages})").fetchall()
+        logger.info(f"Retention removed {deleted} dumps from history, {free_pages} pages reclaimed.")
+        return deleted
+    finally:
+        connection.close()
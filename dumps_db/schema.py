@@ -0,0 +1,129 @@
+import os
+import re
+import time
+from collections import Counter, namedtuple
+
+TABLE = "Dumps"
+STATS_TABLE = "DumpStats"
+
+# 0 - a unique 'dump' String(60) column with the file name only (no user_version set).
+# 1 - name and stat based identity (no user_version set either).
+# 2 - dump history: where the dump was found, its stat data and hash, when it was seen, notified, archived
+#     and when it disappeared from the logs.
+# 3 - per day, root and signature counters of notified dumps.
+SCHEMA_VERSION = 3
+
+HISTORY_COLUMNS = (
+    ("root", "VARCHAR"),
+    ("path", "VARCHAR"),
+    ("size", "INTEGER"),
+    ("mtime", "FLOAT"),
+    ("hash", "VARCHAR"),
+    ("first_seen", "FLOAT"),
+    ("notified_at", "FLOAT"),
+    ("archive_path", "VARCHAR"),
+    ("removed_at", "FLOAT"),
+)
+
+CREATE_TABLE = (f"CREATE TABLE {TABLE} (dump VARCHAR NOT NULL, identity VARCHAR, "
+                + ", ".join(f"{name} {column_type}" for name, column_type in HISTORY_COLUMNS) + ")")
+
+INDEXES = (
+    f"CREATE UNIQUE INDEX IF NOT EXISTS ix_dumps_identity ON {TABLE} (identity)",
+    f"CREATE INDEX IF NOT EXISTS ix_dumps_first_seen ON {TABLE} (first_seen)",
+    f"CREATE INDEX IF NOT EXISTS ix_dumps_notified_at ON {TABLE} (notified_at)",
+    f"CREATE INDEX IF NOT EXISTS ix_dumps_hash ON {TABLE} (hash)",
+)
+
+# Counted once, when a dump is notified, in the same transaction. The counters outlive the history rows
+# removed by the retention job.
+CREATE_STATS_TABLE = (f"CREATE TABLE IF NOT EXISTS {STATS_TABLE} (day VARCHAR NOT NULL, root VARCHAR NOT NULL, "
+                      f"signature VARCHAR NOT NULL, count INTEGER NOT NULL DEFAULT 0, size INTEGER NOT NULL DEFAULT 0, "
+                      f"PRIMARY KEY (day, root, signature)) WITHOUT ROWID")
+
+STATS_INSERT = f"INSERT OR IGNORE INTO {STATS_TABLE} (day, root, signature) VALUES (:day, :root, :signature)"
+STATS_UPDATE = (f"UPDATE {STATS_TABLE} SET count = count + :count, size = size + :size "
+                f"WHERE day = :day AND root = :root AND signature = :signature")
+
+STATS_KEYS = ("day", "root", "signature")
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+_DIGITS = re.compile(r"\d+")
+
+HistoryRecord = namedtuple("HistoryRecord", ["dump", "identity"] + [name for name, _ in HISTORY_COLUMNS])
+
+CrashStats = namedtuple("CrashStats", ["key", "count", "size"])
+
+
+def dump_signature(file_name):
+    # Dumps of one crash differ by pids, dates and counters only: "app.exe.1234.dmp" and "app.exe.5678.dmp"
+    # are both "app.exe.#".
+    return _DIGITS.sub("#", os.path.splitext(file_name)[0])
+
+
+def stats_day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+def stats_values(file_name, root, size, timestamp, count=1):
+    return {"day": stats_day(timestamp), "root": root or "", "signature": dump_signature(file_name),
+            "count": count, "size": size or 0}
+
+
+def ensure_incremental_vacuum(execute):
+    # Lets the retention job give deleted pages back with PRAGMA incremental_vacuum. Has to run outside of a
+    # transaction: an existing file only switches the mode when it's rebuilt by VACUUM.
+    if execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return
+    execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if execute(f"PRAGMA table_info({TABLE})").fetchall():
+        execute("VACUUM")
+
+
+def upgrade(execute, now):
+    # `execute` runs one SQL statement and returns a cursor, both backends pass their own connection here so
+    # the file has one schema whichever of them opens it. Rows that existed before the history was kept have
+    # been notified already, they get `now` as first-seen and notified-at time.
+    columns = [row[1] for row in execute(f"PRAGMA table_info({TABLE})").fetchall()]
+    version = execute("PRAGMA user_version").fetchone()[0]
+
+    if not columns:
+        execute(CREATE_TABLE)
+    elif version == 0 and "identity" not in columns:
+        # Old rows are kept with an empty identity and are adopted by the first dump with the same name.
+        execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy")
+        execute(CREATE_TABLE)
+        execute(f"INSERT INTO {TABLE} (dump, first_seen, notified_at) SELECT dump, {now!r}, {now!r} FROM {TABLE}_legacy")
+        execute(f"DROP TABLE {TABLE}_legacy")
+    elif version < 2:
+        for name, column_type in HISTORY_COLUMNS:
+            if name not in columns:
+                execute(f"ALTER TABLE {TABLE} ADD COLUMN {name} {column_type}")
+        execute(f"UPDATE {TABLE} SET first_seen = {now!r}, notified_at = {now!r} WHERE notified_at IS NULL")
+
+    execute(CREATE_STATS_TABLE)
+    if columns and version < 3:
+        _count_history(execute)
+
+    for index in INDEXES:
+        execute(index)
+    if version != SCHEMA_VERSION:
+        execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _count_history(execute):
+    # Rows notified before the counters existed. Legacy rows don't have the dump time, the notification time
+    # stands in for it.
+    counts = Counter()
+    sizes = Counter()
+    for file_name, root, size, mtime, notified_at in execute(
+            f"SELECT dump, root, size, mtime, notified_at FROM {TABLE} WHERE notified_at IS NOT NULL").fetchall():
+        values = stats_values(file_name, root, size, notified_at if mtime is None else mtime)
+        key = tuple(values[name] for name in STATS_KEYS)
+        counts[key] += 1
+        sizes[key] += values["size"]
+    for key, count in counts.items():
+        values = dict(zip(STATS_KEYS, key), count=count, size=sizes[key])
+        execute(STATS_INSERT, values)
+        execute(STATS_UPDATE, values)
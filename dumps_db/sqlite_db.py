@@ -0,0 +1,184 @@
+import sqlite3
+import time
+
+from .db import DB_PATH, _chunks, _history_values
+from .schema import TABLE, STATS_TABLE, STATS_INSERT, STATS_UPDATE, STATS_KEYS, HistoryRecord, CrashStats, \
+    ensure_incremental_vacuum, stats_day, stats_values, upgrade
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-2000",
+    "PRAGMA busy_timeout=5000",
+)
+
+HISTORY_INSERT = (f"INSERT OR IGNORE INTO {TABLE} (dump, identity, root, path, size, mtime, hash, first_seen) "
+                  f"VALUES (:dump, :identity, :root, :path, :size, :mtime, :hash, :first_seen)")
+
+
+def _placeholders_bucket(count):
+    # Lookups are padded to a power of two of parameters, so only a handful of distinct statements exist
+    # and every one of them stays in the connection's prepared statement cache.
+    bucket = 1
+    while bucket < count:
+        bucket *= 2
+    return bucket
+
+
+class SQLiteDumpsDB:
+    __tablename__ = TABLE
+
+    def __init__(self, path=DB_PATH):
+        self.connection = sqlite3.connect(path, isolation_level=None, cached_statements=256)
+        for pragma in PRAGMAS:
+            self.connection.execute(pragma)
+
+        ensure_incremental_vacuum(self.connection.execute)
+        with self._transaction():
+            upgrade(self.connection.execute, time.time())
+        self._legacy_rows = self.connection.execute(
+            f"SELECT count(*) FROM {self.__tablename__} WHERE identity IS NULL").fetchone()[0]
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    def _select_in(self, column, values, condition=""):
+        for chunk in _chunks(values):
+            bucket = _placeholders_bucket(len(chunk))
+            query = f"SELECT {column} FROM {self.__tablename__} WHERE {condition}{column} IN ({', '.join('?' * bucket)})"
+            yield from self.connection.execute(query, chunk + [None] * (bucket - len(chunk)))
+
+    @property
+    def has_legacy_rows(self):
+        return self._legacy_rows > 0
+
+    def notified_identities(self):
+        return (row[0] for row in self.connection.execute(
+            f"SELECT identity FROM {self.__tablename__} WHERE identity IS NOT NULL AND notified_at IS NOT NULL"))
+
+    def check_exist(self, dump):
+        return not self.new_dumps([dump])
+
+    def new_dumps(self, dumps):
+        identities = list({dump.identity for dump in dumps})
+        known = {row[0] for row in self._select_in("identity", identities, condition="notified_at IS NOT NULL AND ")}
+
+        new = [dump for dump in dumps if dump.identity not in known]
+        if self._legacy_rows and new:
+            adopted = self._adopt_legacy(new)
+            new = [dump for dump in new if dump.identity not in adopted]
+        return new
+
+    def _adopt_legacy(self, dumps):
+        by_name = {}
+        for dump in dumps:
+            by_name.setdefault(dump.file_name, dump)
+
+        adopted = set()
+        with self._transaction():
+            for (name,) in list(self._select_in("dump", list(by_name), condition="identity IS NULL AND ")):
+                dump = by_name[name]
+                self.connection.execute(f"DELETE FROM {self.__tablename__} WHERE identity = ?", (dump.identity,))
+                self.connection.execute(f"UPDATE {self.__tablename__} SET identity = :identity, root = :root, path = :path, "
+                                        f"size = :size, mtime = :mtime, hash = :hash WHERE identity IS NULL AND dump = :dump",
+                                        _history_values(dump, None))
+                adopted.add(dump.identity)
+        self._legacy_rows -= len(adopted)
+        return adopted
+
+    def record_detected(self, dumps):
+        now = time.time()
+        with self._transaction():
+            self.connection.executemany(HISTORY_INSERT, (_history_values(dump, now) for dump in dumps))
+
+    def insert(self, dump):
+        self.insert_many([dump])
+
+    def insert_many(self, dumps):
+        now = time.time()
+        with self._transaction():
+            for dump in dumps:
+                self._insert(dump, now)
+
+    def _insert(self, dump, now):
+        self.connection.execute(HISTORY_INSERT, _history_values(dump, now))
+        notified = self.connection.execute(f"UPDATE {self.__tablename__} SET notified_at = ? "
+                                           f"WHERE identity = ? AND notified_at IS NULL", (now, dump.identity)).rowcount
+        self.connection.execute(f"UPDATE {self.__tablename__} SET removed_at = NULL, "
+                                f"hash = coalesce(?, hash), archive_path = coalesce(?, archive_path) WHERE identity = ?",
+                                (dump.content_hash, dump.archive_path, dump.identity))
+        if notified:
+            values = stats_values(dump.file_name, dump.root, dump.size, dump.mtime)
+            self.connection.execute(STATS_INSERT, values)
+            self.connection.execute(STATS_UPDATE, values)
+
+    def delete(self, identity):
+        self.connection.execute(f"DELETE FROM {self.__tablename__} WHERE identity = ?", (identity,))
+
+    def prune(self, keep_identities, keep_names=()):
+        with self._transaction():
+            removed = self._prune_legacy(set(keep_names), time.time()) if self._legacy_rows else 0
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS keep_identities (identity TEXT PRIMARY KEY)")
+            self.connection.execute("DELETE FROM keep_identities")
+            self.connection.executemany("INSERT OR IGNORE INTO keep_identities (identity) VALUES (?)",
+                                        ((identity,) for identity in keep_identities))
+            # A dump missed by an earlier cycle is live again, the retention job only deletes dumps that are gone.
+            self.connection.execute(f"UPDATE {self.__tablename__} SET removed_at = NULL WHERE removed_at IS NOT NULL "
+                                    f"AND identity IN (SELECT identity FROM keep_identities)")
+            removed += self.connection.execute(f"UPDATE {self.__tablename__} SET removed_at = ? WHERE removed_at IS NULL "
+                                              f"AND identity NOT IN (SELECT identity FROM keep_identities)",
+                                              (time.time(),)).rowcount
+            self.connection.execute("DELETE FROM keep_identities")
+            return removed
+
+    def _prune_legacy(self, keep_names, now):
+        # Legacy rows are known by name only: marked gone while no kept dump has their name, still adopted
+        # until retention deletes them.
+        gone = [name for (name,) in self.connection.execute(
+            f"SELECT dump FROM {self.__tablename__} WHERE identity IS NULL AND removed_at IS NULL").fetchall()
+            if name not in keep_names]
+        removed = 0
+        for chunk in _chunks(gone):
+            removed += self.connection.execute(f"UPDATE {self.__tablename__} SET removed_at = ? WHERE identity IS NULL "
+                                               f"AND dump IN ({', '.join('?' * len(chunk))})", (now, *chunk)).rowcount
+        return removed
+
+    def history(self, since=None, limit=100):
+        columns = ", ".join(HistoryRecord._fields)
+        if since is None:
+            rows = self.connection.execute(f"SELECT {columns} FROM {self.__tablename__} ORDER BY first_seen DESC LIMIT ?",
+                                           (limit,))
+        else:
+            rows = self.connection.execute(f"SELECT {columns} FROM {self.__tablename__} WHERE first_seen >= ? "
+                                           f"ORDER BY first_seen DESC LIMIT ?", (since, limit))
+        return [HistoryRecord(*row) for row in rows]
+
+    def crash_stats(self, by="day", since=None):
+        if by not in STATS_KEYS:
+            raise ValueError(f"Unknown crash stats key '{by}'.")
+        where, parameters = ("", ()) if since is None else ("WHERE day >= ?", (stats_day(since),))
+        rows = self.connection.execute(f"SELECT {by}, sum(count), sum(size) FROM {STATS_TABLE} {where} "
+                                       f"GROUP BY {by} ORDER BY {by}", parameters)
+        return [CrashStats(*row) for row in rows]
+
+    @property
+    def all_values(self):
+        return [row[0] for row in self.connection.execute(
+            f"SELECT identity FROM {self.__tablename__} WHERE identity IS NOT NULL AND removed_at IS NULL")]
+
+    def close(self):
+        self.connection.close()
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -16,6 +16,10 @@ class PathDoesntExist(Exception):
         self.path_to = path_of
 
 
+class DatabaseUnavailableError(Exception):
+    pass
+
+
 class NetworkConnectionError(EmailSendingError):
     pass
 
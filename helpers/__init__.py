@@ -1 +1 @@
-from .helpers import load_and_get_configs, load_default_config, is_admin, CONFIG_PATH
+from .helpers import load_and_get_configs, load_default_config, is_admin, file_hash, CONFIG_PATH
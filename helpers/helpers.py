@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 
@@ -19,6 +20,32 @@ def load_default_config():
     "SECONDS": 0
     },
 
+  "SCANNER": {
+    "MODE": "EVENTS",
+    "SAFETY_POLL": 300,
+    "MAX_DEPTH": null,
+    "WORKERS": 4,
+    "INCREMENTAL": true,
+    "STABLE_AFTER": 5,
+    "PERSIST_STATE": true,
+    "REMOTE_ROOTS": null,
+    "REMOTE_CONCURRENCY": 8,
+    "ROOT_TIMEOUT": 30,
+    "MAX_DUMPS_PER_CYCLE": 100
+    },
+
+  "DATABASE": {
+    "BACKEND": "SQLALCHEMY",
+    "CACHE": true,
+    "CACHE_EXACT_LIMIT": 100000,
+    "RETENTION_DAYS": 90,
+    "RETENTION_ROWS": 100000,
+    "RETENTION_BATCH_SIZE": 500,
+    "RETENTION_INTERVAL_HOURS": 6,
+    "GROUP_COMMIT_SIZE": 256,
+    "GROUP_COMMIT_INTERVAL": 0.5
+    },
+
   "EMAIL":{
 
     "RECIPIENT_ADDRESSES": [
@@ -27,7 +54,14 @@ def load_default_config():
     "ATTACH_FILES_MAX_SIZE": 25,
     "SEND_DMP_FILES": false,
     "TITLE": "DMP in logs!",
-    "SUBJECT": ""
+    "SUBJECT": "",
+    "SMTP_CONNECTIONS": 2,
+    "COMPRESSION_TIME_BUDGET": 30,
+    "COALESCE_WINDOW": 10,
+    "COALESCE_MAX_HOLD": 60,
+    "COALESCE_MAX_BATCH": 50,
+    "RETRY_BASE_DELAY": 30,
+    "RETRY_MAX_DELAY": 3600
   },
   
   "UTILITY_CONFIGS": {
@@ -64,3 +98,11 @@ def is_admin():
         return os.getuid() == 0
     except AttributeError:
         return ctypes.windll.shell32.IsUserAnAdmin() != 0
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1 @@
+from .journal import DumpJournal, JOURNAL_PATH, DETECTED, SENT, ARCHIVED
@@ -0,0 +1,184 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from scanner import Dump
+
+logger = logging.getLogger("DumpChecker")
+
+JOURNAL_PATH = os.path.join(os.environ["TEMP"], "dump_checker.journal")
+MAGIC = b"DCJ\x01"
+
+DETECTED = 1
+SENT = 2
+ARCHIVED = 3
+
+_CRC = struct.Struct("<I")
+# Payload length, event and its time. The crc32 before it covers this header and the payload.
+_HEADER = struct.Struct("<IBd")
+# Size, mtime, dev, ino and the lengths of the path, root, hash and archive path strings that follow.
+_DUMP = struct.Struct("<QdQQHHHH")
+
+
+def _encode(event, dump, timestamp):
+    strings = [value.encode("utf-8") if value else b""
+               for value in (dump.full_path, dump.root, dump.content_hash, dump.archive_path)]
+    payload = _DUMP.pack(dump.size, dump.mtime, dump.dev, dump.ino, *map(len, strings)) + b"".join(strings)
+    header = _HEADER.pack(len(payload), event, timestamp)
+    return _CRC.pack(zlib.crc32(payload, zlib.crc32(header))) + header + payload
+
+
+def _decode(payload):
+    size, mtime, dev, ino, *lengths = _DUMP.unpack_from(payload)
+    strings = []
+    offset = _DUMP.size
+    for length in lengths:
+        strings.append(payload[offset:offset + length].decode("utf-8") or None)
+        offset += length
+    full_path, root, content_hash, archive_path = strings
+    dump = Dump(full_path, size, mtime, root=root, dev=dev, ino=ino)
+    dump.content_hash = content_hash
+    dump.archive_path = archive_path
+    return dump
+
+
+class DumpJournal:
+    """
+    Append-only log of detected, sent and archived dumps. A dump that was sent but never made it into the
+    database (the process died in between) is found here on the next start, so it isn't sent again.
+
+    Every append reaches the OS right away and survives a crash of the process, fsync runs once per
+    SYNC_EVERY records or SYNC_INTERVAL seconds. Archived dumps live in the database, compaction drops them.
+    """
+
+    SYNC_EVERY = 64
+    SYNC_INTERVAL = 5.0
+    COMPACT_MIN_RECORDS = 1024
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # identity -> (latest event, dump)
+        self._state = {}
+        self.records = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+        started = time.perf_counter()
+        self._replay()
+        logger.debug(f"Journal replay of {self.records} records took {(time.perf_counter() - started) * 1000:.1f} ms")
+        self._file = open(self.path, "ab")
+        self.maybe_compact()
+
+    def _replay(self):
+        try:
+            file = open(self.path, "r+b")
+        except FileNotFoundError:
+            self._rewrite([])
+            return
+
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size < len(MAGIC):
+                valid_end = 0
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    valid_end = self._read(view, size)
+
+            if valid_end == 0:
+                logger.warning(f"Journal '{self.path}' is damaged, start a new one.")
+            elif valid_end < size:
+                # A torn write at the tail: the process died in the middle of an append.
+                logger.warning(f"Journal '{self.path}' has {size - valid_end} damaged bytes at the end, dropped.")
+                file.truncate(valid_end)
+        if valid_end == 0:
+            self._rewrite([])
+
+    def _read(self, view, size):
+        if view[:len(MAGIC)] != MAGIC:
+            return 0
+        offset = len(MAGIC)
+        while offset + _CRC.size + _HEADER.size <= size:
+            crc, = _CRC.unpack_from(view, offset)
+            length, event, _ = _HEADER.unpack_from(view, offset + _CRC.size)
+            start = offset + _CRC.size + _HEADER.size
+            if start + length > size or zlib.crc32(view[start:start + length], zlib.crc32(
+                    view[offset + _CRC.size:start])) != crc:
+                break
+            self._apply(event, _decode(view[start:start + length]))
+            self.records += 1
+            offset = start + length
+        return offset
+
+    def _apply(self, event, dump):
+        current = self._state.get(dump.identity)
+        if current is None or event >= current[0]:
+            self._state[dump.identity] = (event, dump)
+
+    def append(self, event, dumps):
+        now = time.time()
+        records = b"".join(_encode(event, dump, now) for dump in dumps)
+        with self._lock:
+            self._file.write(records)
+            self._file.flush()
+            for dump in dumps:
+                self._apply(event, dump)
+            self.records += len(dumps)
+            self._unsynced += len(dumps)
+            if self._unsynced >= self.SYNC_EVERY or time.monotonic() - self._synced_at >= self.SYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def was_sent(self, identity):
+        entry = self._state.get(identity)
+        return entry is not None and entry[0] >= SENT
+
+    def sent_unarchived(self):
+        return [dump for event, dump in self._state.values() if event == SENT]
+
+    def maybe_compact(self):
+        with self._lock:
+            live = [entry for entry in self._state.values() if entry[0] != ARCHIVED]
+            if self.records < self.COMPACT_MIN_RECORDS or self.records <= 2 * len(live):
+                return False
+            records = self.records
+            self._file.close()
+            try:
+                self._rewrite(live)
+            finally:
+                self._file = open(self.path, "ab")
+        logger.info(f"Journal compacted from {records} to {self.records} records.")
+        return True
+
+    def _rewrite(self, entries):
+        # The file is replaced, never rewritten in place, a crash leaves either the old or the new journal.
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(MAGIC)
+            now = time.time()
+            f.write(b"".join(_encode(event, dump, now) for event, dump in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._state = {dump.identity: (event, dump) for event, dump in entries}
+        self.records = len(entries)
+        self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
@@ -0,0 +1,5 @@
+from .pool import SmtpPool
+from .coalescer import NotificationCoalescer
+from .outbox import Outbox, OutboxEntry
+from .attachments import compress_dumps, choose_codec, remove_attachment, attachments_directory, remove_attachments
+from .splitter import split_file, pack
@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import lzma
+import os
+import shutil
+import time
+import zipfile
+import zlib
+
+logger = logging.getLogger("DumpChecker")
+
+ATTACHMENTS_PATH = os.path.join(os.environ["TEMP"], "dump_checker_attachments")
+CHUNK_SIZE = 1024 * 1024
+
+# From the best ratio to the fastest one: (zip method, level, in-memory compressor for the speed sample).
+CODECS = (
+    (zipfile.ZIP_LZMA, None, lzma.compress),
+    (zipfile.ZIP_DEFLATED, 9, lambda data: zlib.compress(data, 9)),
+    (zipfile.ZIP_DEFLATED, 6, lambda data: zlib.compress(data, 6)),
+    (zipfile.ZIP_DEFLATED, 1, lambda data: zlib.compress(data, 1)),
+)
+
+
+def choose_codec(dumps, time_budget, chunk_size=CHUNK_SIZE):
+    # Times every codec on the first chunk of the largest dump and takes the best ratio expected to compress
+    # all of them within time_budget seconds, the fastest codec if none is.
+    total_size = sum(dump.size for dump in dumps)
+    largest = max(dumps, key=lambda dump: dump.size)
+    with open(largest.full_path, "rb") as f:
+        sample = f.read(chunk_size)
+    if not sample:
+        return CODECS[-1][:2]
+
+    for method, level, compress in CODECS:
+        started = time.perf_counter()
+        compress(sample)
+        expected = (time.perf_counter() - started) * total_size / len(sample)
+        if expected <= time_budget:
+            return method, level
+    return CODECS[-1][:2]
+
+
+def compress_dumps(dumps, name, time_budget=30.0, directory=ATTACHMENTS_PATH, chunk_size=CHUNK_SIZE):
+    """
+    Streams the dumps into one zip archive chunk by chunk, so memory stays bounded whatever their size, and
+    sets their content hash on the way. Returns the archive path, the caller removes it after sending.
+    """
+    method, level = choose_codec(dumps, time_budget, chunk_size)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.zip")
+    started = time.perf_counter()
+    try:
+        with zipfile.ZipFile(path, "w", compression=method, compresslevel=level) as archive:
+            for dump in dumps:
+                digest = hashlib.blake2b(digest_size=20)
+                with open(dump.full_path, "rb") as source, archive.open(dump.file_name, "w", force_zip64=True) as target:
+                    for chunk in iter(lambda: source.read(chunk_size), b""):
+                        digest.update(chunk)
+                        target.write(chunk)
+                dump.content_hash = digest.hexdigest()
+    except BaseException:
+        remove_attachment(path)
+        raise
+    logger.info(f"Compressed {len(dumps)} dumps ({sum(dump.size for dump in dumps)} bytes) to {os.path.getsize(path)} "
+                f"bytes with {zipfile.compressor_names[method]} in {time.perf_counter() - started:.1f} s")
+    return path
+
+
+def remove_attachment(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def attachments_directory(key):
+    # Everything built for one outbox entry, kept until the entry is done so retries reuse it.
+    return os.path.join(ATTACHMENTS_PATH, key)
+
+
+def remove_attachments(key):
+    shutil.rmtree(attachments_directory(key), ignore_errors=True)
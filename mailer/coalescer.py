@@ -0,0 +1,54 @@
+import time
+
+
+class NotificationCoalescer:
+    """
+    Holds new dumps back so that a crash loop costs one email instead of one per check. A batch goes out once
+    no new dump came for `window` seconds, once its oldest dump waited `max_hold` seconds or once it has
+    `max_batch` dumps, whichever is first. Dumps already taken are the outbox's to deduplicate.
+    """
+
+    def __init__(self, window=10.0, max_hold=60.0, max_batch=50):
+        self.window = window
+        self.max_hold = max_hold
+        self.max_batch = max_batch
+        self._pending = {}
+        self._first_at = None
+        self._last_at = None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def add(self, dumps, now=None):
+        now = time.monotonic() if now is None else now
+        added = []
+        for dump in dumps:
+            if dump.identity in self._pending:
+                continue
+            self._pending[dump.identity] = dump
+            added.append(dump)
+        if added:
+            if self._first_at is None:
+                self._first_at = now
+            self._last_at = now
+        return added
+
+    def next_flush_in(self, now=None):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.max_batch:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, min(self._last_at + self.window, self._first_at + self.max_hold) - now)
+
+    def take(self, now=None):
+        if self.next_flush_in(now) != 0.0:
+            return []
+        identities = list(self._pending)[:self.max_batch]
+        batch = [self._pending.pop(identity) for identity in identities]
+        # Leftovers above max_batch keep the batch's times: they go out once max_batch dumps are pending again,
+        # or when the original window or max_hold runs out.
+        if not self._pending:
+            self._first_at = self._last_at = None
+        return batch
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from scanner import Dump
+from .attachments import remove_attachments
+
+logger = logging.getLogger("DumpChecker")
+
+OUTBOX_PATH = os.path.join(os.environ["TEMP"], "dump_checker_outbox")
+
+
+class OutboxEntry:
+    __slots__ = ("key", "dumps", "created", "attempts", "next_attempt", "parts", "parts_sent")
+
+    def __init__(self, key, dumps, created, attempts=0, next_attempt=0.0, parts=None, parts_sent=0):
+        self.key = key
+        self.dumps = dumps
+        self.created = created
+        self.attempts = attempts
+        self.next_attempt = next_attempt
+        # Attachments of every message, built once: a retry sends the very same messages and goes on from
+        # the first one not sent yet.
+        self.parts = parts
+        self.parts_sent = parts_sent
+
+    @property
+    def message_id(self):
+        # The same notification keeps its Message-ID across retries, a resend after a crash between the SMTP
+        # answer and done() is recognized as a duplicate by the mail clients.
+        return f"<{self.key}@dump-checker>"
+
+    def part_message_id(self, number):
+        return f"<{self.key}.{number}@dump-checker>"
+
+    def as_dict(self):
+        return {"key": self.key, "created": self.created, "attempts": self.attempts, "next_attempt": self.next_attempt,
+                "parts": self.parts, "parts_sent": self.parts_sent,
+                "dumps": [[*dump.as_tuple(), dump.content_hash, dump.archive_path] for dump in self.dumps]}
+
+    @classmethod
+    def from_dict(cls, values):
+        dumps = []
+        for dump_values in values["dumps"]:
+            # Entries written before the archive path was kept have one value less.
+            dump = Dump.from_tuple(dump_values[:6])
+            dump.content_hash, dump.archive_path = (*dump_values[6:], None, None)[:2]
+            dumps.append(dump)
+        return cls(values["key"], dumps, values["created"], values["attempts"], values["next_attempt"],
+                   values.get("parts"), values.get("parts_sent", 0))
+
+
+class Outbox:
+    """
+    Notifications waiting to be sent, one JSON file per notification so a crash or a network outage loses
+    nothing. A failed send backs off exponentially with jitter, up to `max_delay`. A network or SMTP failure
+    pauses the whole outbox until then, the reasons (no network, quota exceeded) are the same for every
+    message, any other failure only holds back the entry that caused it.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, base_delay=30.0, max_delay=3600.0):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._entries = {}
+        self._identities = set()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Reads the notifications left from the last run. Kept out of __init__: it's disk I/O the GUI thread
+        # mustn't wait for.
+        os.makedirs(self.path, exist_ok=True)
+        for file_name in os.listdir(self.path):
+            file_path = os.path.join(self.path, file_name)
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(file_path) as f:
+                    entry = OutboxEntry.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError, AssertionError) as er:
+                logger.warning(f"Can't load outbox entry '{file_path}': {er}. Dropped.")
+                os.remove(file_path)
+                continue
+            with self._lock:
+                self._add(entry)
+        if self._entries:
+            logger.info(f"Outbox has {len(self._entries)} notifications left from the last run.")
+
+    def _add(self, entry):
+        self._entries[entry.key] = entry
+        self._identities.update(dump.identity for dump in entry.dumps)
+
+    def _save(self, entry):
+        file_path = os.path.join(self.path, f"{entry.key}.json")
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(entry.as_dict(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, identity):
+        return identity in self._identities
+
+    def entries(self):
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: entry.created)
+
+    def put(self, dumps):
+        key = hashlib.blake2b("\n".join(sorted(dump.identity for dump in dumps)).encode("utf-8"),
+                              digest_size=16).hexdigest()
+        with self._lock:
+            if key not in self._entries:
+                entry = OutboxEntry(key, list(dumps), time.time())
+                self._save(entry)
+                self._add(entry)
+        return key
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self._paused_until:
+                return []
+            return sorted((entry for entry in self._entries.values() if entry.next_attempt <= now),
+                          key=lambda entry: entry.created)
+
+    def next_due_in(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._entries:
+                return None
+            next_attempt = max(self._paused_until, min(entry.next_attempt for entry in self._entries.values()))
+        return max(0.0, next_attempt - now)
+
+    def done(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._identities.difference_update(dump.identity for dump in entry.dumps)
+            try:
+                os.remove(os.path.join(self.path, f"{key}.json"))
+            except FileNotFoundError:
+                pass
+        remove_attachments(key)
+
+    def set_parts(self, key, parts):
+        # Saved together with the content hashes and archive paths the attachments stage set on the entry dumps.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.parts = parts
+                entry.parts_sent = 0
+                self._save(entry)
+
+    def part_sent(self, key, number):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.parts_sent = number
+                self._save(entry)
+
+    def failed(self, key, pause=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            delay = min(self.max_delay, self.base_delay * 2 ** min(entry.attempts, 32)) * random.uniform(0.5, 1.0)
+            entry.attempts += 1
+            entry.next_attempt = time.time() + delay
+            if pause:
+                self._paused_until = entry.next_attempt
+            self._save(entry)
+            return delay
@@ -0,0 +1,133 @@
+import logging
+import queue
+import smtplib
+import socket
+import threading
+import time
+from email.utils import formatdate, make_msgid, getaddresses, parseaddr
+
+logger = logging.getLogger("DumpChecker")
+
+GMAIL_SERVER = "smtp.gmail.com"
+GMAIL_PORT = 587
+
+
+class _Connection:
+    __slots__ = ("session", "used_at")
+
+    def __init__(self):
+        self.session = None
+        self.used_at = 0.0
+
+
+class SmtpPool:
+    """
+    Authenticated SMTP sessions kept open between sends and shared by every sender thread. A session used
+    within KEEPALIVE seconds is trusted as is, an older one is checked with NOOP first, and one idle for more
+    than MAX_IDLE seconds is closed and opened again (GMail drops idle sessions on its side anyway). A session
+    that turns out dead while sending is reconnected and the message is sent once more.
+    """
+
+    KEEPALIVE = 30.0
+    MAX_IDLE = 300.0
+
+    def __init__(self, login, password, size=2, server=GMAIL_SERVER, port=GMAIL_PORT, timeout=60):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.sender = login
+        self.username = parseaddr(login)[1]
+        self.password = password
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and self._opened < self.size:
+                self._opened += 1
+                return _Connection()
+        return self._idle.get()
+
+    def _release(self, connection):
+        self._idle.put(connection)
+
+    def _connect(self, connection):
+        self._disconnect(connection)
+        session = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            session.ehlo()
+            session.starttls()
+            session.ehlo()
+            session.login(self.username, self.password)
+        except BaseException:
+            session.close()
+            raise
+        connection.session = session
+        logger.debug(f"SMTP session to {self.server}:{self.port} opened.")
+
+    @staticmethod
+    def _disconnect(connection):
+        if connection.session is None:
+            return
+        try:
+            connection.session.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.session.close()
+        connection.session = None
+
+    def _ready(self, connection):
+        idle = time.monotonic() - connection.used_at
+        if connection.session is None or idle > self.MAX_IDLE:
+            return False
+        if idle <= self.KEEPALIVE:
+            return True
+        try:
+            return connection.session.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        # Fills the same headers as gmail.GMail.send, the recipients come from To/Cc/Bcc.
+        rcpt = [address for _, address in getaddresses((message.get_all("To") or []) + (message.get_all("Cc") or []) +
+                                                       (message.get_all("Bcc") or []))]
+        if message["From"] is None:
+            message["From"] = self.sender
+        if message["Reply-To"] is None:
+            message["Reply-To"] = self.sender
+        if message["Date"] is None:
+            message["Date"] = formatdate(time.time(), localtime=True)
+        if message["Message-ID"] is None:
+            message["Message-ID"] = make_msgid()
+        del message["Bcc"]
+        data = message.as_string()
+
+        connection = self._acquire()
+        try:
+            if not self._ready(connection):
+                self._connect(connection)
+            try:
+                connection.session.sendmail(self.sender, rcpt, data)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+                logger.info("SMTP session went stale, reconnect.")
+                self._connect(connection)
+                connection.session.sendmail(self.sender, rcpt, data)
+            connection.used_at = time.monotonic()
+        except BaseException:
+            self._disconnect(connection)
+            raise
+        finally:
+            self._release(connection)
+
+    def close(self):
+        # Only idle sessions are closed, they stay in the pool and are opened again by the next send.
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for connection in idle:
+            self._disconnect(connection)
+            self._release(connection)
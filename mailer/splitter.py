@@ -0,0 +1,43 @@
+import os
+
+from .attachments import CHUNK_SIZE
+
+
+def split_file(path, part_size, chunk_size=CHUNK_SIZE):
+    # Plain byte ranges named path.001, path.002, ..., joined back by `copy /b` or opened directly by 7-Zip.
+    parts = []
+    with open(path, "rb") as source:
+        while True:
+            part_path = f"{path}.{len(parts) + 1:03d}"
+            written = 0
+            with open(part_path, "wb") as target:
+                while written < part_size:
+                    chunk = source.read(min(chunk_size, part_size - written))
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    written += len(chunk)
+            if not written:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+            if written < part_size:
+                break
+    return parts
+
+
+def pack(sizes, limit):
+    """
+    First-fit decreasing: `sizes` maps attachments to their sizes, every one of them at most `limit`. Returns
+    the attachments grouped into as few groups under `limit` as it finds, the largest group first.
+    """
+    bins = []
+    for path, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        for group in bins:
+            if group[0] + size <= limit:
+                group[0] += size
+                group[1].append(path)
+                break
+        else:
+            bins.append([size, [path]])
+    return [paths for _, paths in bins]
@@ -1,9 +1,15 @@
 import json
 import logging
+import lzma
+import math
 import os
+import queue
 import smtplib
 import socket
 import sys
+import time
+import zipfile
+from functools import partial
 from threading import Event
 import resources
 
@@ -12,50 +18,22 @@ from PyQt5 import QtCore
 from PyQt5.QtCore import QThread, QSettings, QCoreApplication, QFileInfo, QTimer
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QMainWindow, QApplication, QMessageBox, QSystemTrayIcon
-from gmail import Message, GMail
+from gmail import Message
 
 from checker_ui import Ui_MainWindow
 from constants import PathOf, UTILITY_REG_KEY, EMAIL_RE
 from custom_elements import QLineEditWithEnterClickEvent
-from dumps_db import DumpsDB
-from exceptions import RecipientNotSetError, PathDoesntExist, NetworkConnectionError, DailyEmailQuotaExceededError
-from helpers import load_and_get_configs, CONFIG_PATH, is_admin
+from dumps_db import create_database, apply_retention
+from exceptions import RecipientNotSetError, PathDoesntExist, NetworkConnectionError, DailyEmailQuotaExceededError, \
+    DatabaseUnavailableError
+from journal import DumpJournal, DETECTED, SENT, ARCHIVED
+from helpers import load_and_get_configs, CONFIG_PATH, is_admin, file_hash
 from logger import get_logger
-
-
-class FileSize:
-    def __init__(self, size):
-        self.size = size
-
-    @property
-    def megabytes(self) -> float:
-        return self.size / 1024 / 1024
-
-    @property
-    def kilobytes(self) -> float:
-        return self.size / 1024
-
-
-class Dump:
-    def __init__(self, dump_full_path):
-        assert dump_full_path.endswith(".dmp"), "Received file has extension different then '.dmp'"
-        self._dump = dump_full_path
-
-    @property
-    def file_name(self):
-        return os.path.split(self._dump)[-1]
-
-    @property
-    def full_path(self):
-        return self._dump
-
-    @property
-    def file_size(self):
-        return FileSize(os.path.getsize(self._dump))
-
-    @property
-    def creation_time(self):
-        return arrow.get(os.path.getmtime(self._dump))
+from mailer import SmtpPool, NotificationCoalescer, Outbox, compress_dumps, remove_attachment, attachments_directory, \
+    remove_attachments, split_file, pack
+from scanner import Dump, FileSize, RootsScanner, scan_dumps, DEFAULT_WORKERS, IncrementalScanner, WriteStabilizer, \
+    save_scan_state, load_scan_state, scan_remote, split_remote_roots, DEFAULT_REMOTE_CONCURRENCY
+from watcher import DumpWatcher
 
 
 class EmailSenderThread(QThread):
@@ -63,42 +41,157 @@ class EmailSenderThread(QThread):
     EmailSendSignal = QtCore.pyqtSignal(object)
     EmailSendError = QtCore.pyqtSignal(object)
 
-    def __init__(self, parent, configs, stop_event):
+    def __init__(self, parent, configs, stop_event, journal, smtp_pool, outbox):
         super().__init__(parent)
         self.configs = configs
         self.stop_event = stop_event
-        self.dumps = None
+        self.journal = journal
+        self.smtp_pool = smtp_pool
+        self.outbox = outbox
 
     def run(self):
-        dump_file_names = "\n".join([d.file_name for d in self.dumps])
-
+        # Drains the outbox. A network or SMTP failure pauses the outbox for the backoff delay, the rest of it
+        # would fail for the same reason.
+        while not self.stop_event.is_set():
+            entries = self.outbox.due()
+            if not entries:
+                break
+            for entry in entries:
+                if self.stop_event.is_set() or not self.send(entry):
+                    return
+
+    def _parts(self, entry):
+        # Built once per notification and kept with the outbox entry until it's sent: compression timing may
+        # pick another codec next time, and the parts of a retry must match the ones already delivered.
+        if entry.parts is not None and all(os.path.isfile(path) for attachments in entry.parts for path in attachments):
+            return entry.parts
+        remove_attachments(entry.key)
+        parts = self._attachments(entry)
+        self.outbox.set_parts(entry.key, parts)
+        return parts
+
+    def _attachments(self, entry):
+        # Dumps go as they are while they fit in one message. Otherwise every dump is compressed on its own,
+        # archives above the limit are cut into parts, and all of it is packed into as few messages as
+        # possible. Returns the attachments of every message.
+        # Every attached dump gets the names it's attached under as its archive path.
+        email_configs = self.configs["EMAIL"]
+        for d in entry.dumps:
+            d.archive_path = None
+        dumps = [d for d in entry.dumps if os.path.isfile(d.full_path)]
+        if not email_configs["SEND_DMP_FILES"] or not dumps:
+            return [[]]
+
+        max_size = int(email_configs["ATTACH_FILES_MAX_SIZE"])
+        if sum(d.file_size.megabytes for d in dumps) < max_size:
+            for d in dumps:
+                d.content_hash = file_hash(d.full_path)
+                d.archive_path = d.file_name
+            return [[d.full_path for d in dumps]]
+
+        time_budget = float(email_configs.get("COMPRESSION_TIME_BUDGET", 30))
+        total_size = sum(d.size for d in dumps) or 1
+        limit = max_size * 1024 * 1024 - 1
+        directory = attachments_directory(entry.key)
+        sizes = {}
+        names = set()
+        for index, d in enumerate(dumps, start=1):
+            # Dumps of different roots or directories may share a file name.
+            name = d.file_name if d.file_name.lower() not in names else f"{index}-{d.file_name}"
+            names.add(name.lower())
+            archive = compress_dumps([d], name, time_budget=time_budget * d.size / total_size, directory=directory)
+            archive_size = os.path.getsize(archive)
+            if archive_size <= limit:
+                sizes[archive] = archive_size
+                d.archive_path = os.path.basename(archive)
+                continue
+            logger.info(f"Compressed '{d.file_name}' takes {FileSize(archive_size).megabytes:.1f} Mb, split it into parts.")
+            parts = split_file(archive, limit)
+            for part in parts:
+                sizes[part] = os.path.getsize(part)
+            d.archive_path = ", ".join(os.path.basename(part) for part in parts)
+            remove_attachment(archive)
+        return pack(sizes, limit)
+
+    def _message(self, entry, attachments, number=1, count=1):
+        dump_file_names = "\n".join([d.file_name for d in entry.dumps])
         message = f'{self.configs["EMAIL"]["SUBJECT"]}\nList of dmp:\n{dump_file_names}'
-        auth = self.configs["UTILITY_CONFIGS"]["CHECKER_AUTH"]
-        gmail = GMail(auth["LOGIN"], auth["PASSWORD"])
-        if self.configs["EMAIL"]["SEND_DMP_FILES"] and sum([d.file_size.megabytes for d in self.dumps]) < int(self.configs["EMAIL"]["ATTACH_FILES_MAX_SIZE"]):
-            attachments = [d.full_path for d in self.dumps]
-        else:
-            attachments = []
-
         email_title = self.configs["EMAIL"]["TITLE"]
+        if count > 1:
+            email_title = f"{email_title} ({number}/{count})"
+            message = f"{message}\n\nPart {number} of {count}, attached: " \
+                      f"{', '.join(os.path.basename(path) for path in attachments)}"
         recipient = ";".join(self.configs["EMAIL"]["RECIPIENT_ADDRESSES"])
         msg = Message(email_title, to=recipient, text=message, attachments=attachments)
+        msg["Message-ID"] = entry.message_id if count == 1 else entry.part_message_id(number)
+        return msg
+
+    @staticmethod
+    def _hash(dumps):
+        # Attached dumps are hashed while the attachments are built, the rest here: every row of the history
+        # gets a hash, and no database request waits for a dump to be read.
+        for d in dumps:
+            if d.content_hash is None:
+                try:
+                    d.content_hash = file_hash(d.full_path)
+                except OSError as er:
+                    logger.warning(f"Can't hash '{d.full_path}': {er}")
+
+    def send(self, entry):
+        # Returns whether the rest of the outbox may be sent now.
         logger.info("Start sending email")
         try:
-            gmail.send(msg)
+            try:
+                messages = self._parts(entry)
+            except (OSError, zipfile.BadZipFile, lzma.LZMAError) as er:
+                # A dump still locked by its writer or a full TEMP mustn't hold the notification back.
+                logger.warning(f"Can't prepare attachments: {er}. Send without them.")
+                for d in entry.dumps:
+                    d.archive_path = None
+                messages = [[]]
+            for number, attachments in enumerate(messages, start=1):
+                if number <= entry.parts_sent:
+                    continue
+                try:
+                    message = self._message(entry, attachments, number, len(messages))
+                except OSError as er:
+                    # The attachments are read here: a dump deleted or locked since it was checked is this
+                    # notification's problem, not the network's.
+                    logger.warning(f"Can't attach {attachments}: {er}")
+                    return self._retry_later(entry, pause=False)
+                self.smtp_pool.send(message)
+                if len(messages) > 1:
+                    self.outbox.part_sent(entry.key, number)
         except socket.gaierror as er:
             logger.exception(f"Can't send message.")
             self.EmailSendError.emit(NetworkConnectionError(er))
-
         except smtplib.SMTPDataError as e:
             logger.exception(f"Can't send message.")
             self.EmailSendError.emit(DailyEmailQuotaExceededError(e))
+        except (smtplib.SMTPException, OSError) as e:
+            logger.exception(f"Email sending Error: {e}")
         except Exception as e:
             logger.exception(f"Email sending Error: {e}")
+            return self._retry_later(entry, pause=False)
         else:
-            self.EmailSenderThreadSignal.emit(dump_file_names)
-            self.EmailSendSignal.emit(self.dumps)
+            self._hash(entry.dumps)
+            self.journal.append(SENT, entry.dumps)
+            self.outbox.done(entry.key)
+            self.EmailSenderThreadSignal.emit("\n".join([d.file_name for d in entry.dumps]))
+            self.EmailSendSignal.emit(entry.dumps)
             logger.info("Email send.")
+            return True
+
+        return self._retry_later(entry, pause=True)
+
+    def _retry_later(self, entry, pause):
+        # Returns whether the rest of the outbox may be sent now.
+        delay = self.outbox.failed(entry.key, pause=pause)
+        if pause:
+            logger.info(f"Email retry in {delay:.0f} s, {len(self.outbox)} notifications in the outbox.")
+        else:
+            logger.info(f"Email retry in {delay:.0f} s, the other notifications go on.")
+        return not pause
 
 
 class CheckThread(QThread):
@@ -107,30 +200,266 @@ class CheckThread(QThread):
     def __init__(self, parent, configs):
         super().__init__(parent)
         self.CONFIGS = configs
-
-    def dumps_in_logs(self, log_path):
-        dumps = []
-        cwd, _, logs = next(os.walk(log_path))
-        for filename in logs:
-            name, extension = os.path.splitext(filename)
-            if extension == ".dmp":
-                dump = Dump(os.path.join(cwd, filename))
-                dumps.append(dump)
-        return dumps
+        self.incremental_scanner = IncrementalScanner()
+        self.roots_scanner = RootsScanner(workers=int(configs.get("SCANNER", {}).get("WORKERS", DEFAULT_WORKERS)))
+        self.stabilizer = WriteStabilizer()
+        self.scan_requested = True
+        self._state_loaded = False
+        self._saved_state = None
+
+    def dumps_in_logs(self, logs_path):
+        scanner_configs = self.CONFIGS.get("SCANNER", {})
+        if scanner_configs.get("INCREMENTAL", True):
+            scan = self.incremental_scanner.scan
+        else:
+            scan = scan_dumps
+        _, remote_roots = split_remote_roots(logs_path, scanner_configs.get("REMOTE_ROOTS"))
+        timeout = scanner_configs.get("ROOT_TIMEOUT")
+        concurrency = int(scanner_configs.get("REMOTE_CONCURRENCY", DEFAULT_REMOTE_CONCURRENCY))
+        return self.roots_scanner.scan(logs_path,
+                                       max_depth=scanner_configs.get("MAX_DEPTH"),
+                                       exclude=[self.CONFIGS["DUMPS_STORING_DIRECTORY"]],
+                                       scan=scan,
+                                       remote_scan=partial(scan_remote, concurrency=concurrency),
+                                       remote_roots=remote_roots,
+                                       timeout=None if timeout is None else float(timeout))
 
     def run(self):
         logger.info(f"{arrow.now().format('DD-MM-YYYY HH:mm:ss'):=^70}")
         try:
-            dumps = self.dumps_in_logs(self.CONFIGS["LOGS_PATH"]["SERVER"])
-            if dumps:
+            scanner_configs = self.CONFIGS.get("SCANNER", {})
+            self.stabilizer.quiet_period = float(scanner_configs.get("STABLE_AFTER", 5))
+            max_dumps_per_cycle = scanner_configs.get("MAX_DUMPS_PER_CYCLE")
+            self.stabilizer.max_pending = None if max_dumps_per_cycle is None else int(max_dumps_per_cycle)
+            persist_state = scanner_configs.get("PERSIST_STATE", True)
+            if persist_state and not self._state_loaded:
+                self._state_loaded = True
+                if load_scan_state(self.incremental_scanner, self.stabilizer):
+                    logger.info("Scan state loaded, diff against the previous run.")
+
+            if self.scan_requested:
+                self.stabilizer.update(self.dumps_in_logs(self.CONFIGS["LOGS_PATH"]))
+            released = self.stabilizer.poll()
+
+            state = (self.incremental_scanner.listed, len(self.stabilizer.stable_dumps))
+            if persist_state and (released or state != self._saved_state):
+                try:
+                    save_scan_state(self.incremental_scanner, self.stabilizer)
+                    self._saved_state = state
+                except OSError as er:
+                    # Only the next start-up loses the diff, the dumps of this cycle still go out.
+                    logger.warning(f"Can't save the scan state: {er}")
+            if released:
+                logger.info(f"Dumps finished writing: {[d.file_name for d in released]}")
+            if self.stabilizer.pending:
+                logger.info(f"Dumps still being written: {self.stabilizer.pending}")
+            if self.stabilizer.deferred:
+                logger.info(f"Dumps left for the next cycles: {self.stabilizer.deferred}")
+
+            dumps = self.stabilizer.stable_dumps
+            if dumps and (self.scan_requested or released):
                 self.CheckerThreadSignal.emit(dumps)
             logger.info("=" * 70 + "\n")
         except Exception as ex:
             logger.exception(f"{ex.__class__.__name__}")
 
 
+class RetentionThread(QThread):
+    def __init__(self, parent, configs):
+        super().__init__(parent)
+        self.CONFIGS = configs
+
+    def run(self):
+        database_configs = self.CONFIGS.get("DATABASE", {})
+        max_age_days = database_configs.get("RETENTION_DAYS")
+        max_rows = database_configs.get("RETENTION_ROWS")
+        if max_age_days is None and max_rows is None:
+            return
+        try:
+            apply_retention(max_age_days=None if max_age_days is None else float(max_age_days),
+                            max_rows=None if max_rows is None else int(max_rows),
+                            batch_size=int(database_configs.get("RETENTION_BATCH_SIZE", 500)))
+        except Exception as ex:
+            logger.exception(f"{ex.__class__.__name__}")
+
+
+# Requests DatabaseThread handles itself, any other request is a (handler, args) pair.
+ARCHIVE = "archive"
+COMMIT = "commit"
+
+
+class DatabaseThread(QThread):
+    """
+    Owns the dumps database and the journal, and writes the notifications into the outbox. The GUI only queues
+    requests and gets the answers back as signals. Everything is opened in run(): sqlite connections must stay
+    in the thread that created them, and replaying the journal, loading the outbox and the fsyncs of their
+    writes are disk I/O the event loop mustn't wait for.
+
+    It's the only writer. Inserts are group committed: they wait until GROUP_COMMIT_SIZE dumps are queued or
+    GROUP_COMMIT_INTERVAL seconds passed and go in one transaction. Any other request flushes them first, so
+    reads always see every insert queued before them.
+    """
+
+    NewDumpsSignal = QtCore.pyqtSignal(object)
+    ArchivedSignal = QtCore.pyqtSignal(object)
+    CrashStatsSignal = QtCore.pyqtSignal(object)
+    DatabaseErrorSignal = QtCore.pyqtSignal(object)
+    ReadySignal = QtCore.pyqtSignal(object)
+    QueuedSignal = QtCore.pyqtSignal()
+
+    def __init__(self, parent, configs, outbox):
+        super().__init__(parent)
+        self.CONFIGS = configs
+        self.outbox = outbox
+        self.database = None
+        self.journal = None
+        self.failed = False
+        self._requests = queue.Queue()
+        self._group = []
+        # What the previous lookup already wrote: identities recorded as detected and the set prune() kept.
+        # A cycle that finds the same dumps again costs no transaction.
+        self._recorded = set()
+        self._kept = None
+
+    def run(self):
+        try:
+            self.journal = DumpJournal()
+            self.database = create_database(self.CONFIGS)
+        except Exception as ex:
+            logger.exception(f"Can't open the dumps database: {ex}")
+            # Nothing would ever answer the queued requests, the GUI stops checking instead.
+            self.failed = True
+            if self.journal is not None:
+                self.journal.close()
+            self.DatabaseErrorSignal.emit(DatabaseUnavailableError(f"Can't open the dumps database: {ex}"))
+            return
+
+        unarchived = self.journal.sent_unarchived()
+        if unarchived:
+            logger.info(f"Dumps sent before the last exit but not saved: {[d.file_name for d in unarchived]}")
+            self._group.extend(unarchived)
+            self._commit_group()
+        self.outbox.load()
+        for entry in self.outbox.entries():
+            if all(self.journal.was_sent(dump.identity) for dump in entry.dumps):
+                self.outbox.done(entry.key)
+        self.ReadySignal.emit(self.journal)
+        database_configs = self.CONFIGS.get("DATABASE", {})
+        group_size = int(database_configs.get("GROUP_COMMIT_SIZE", 256))
+        group_interval = float(database_configs.get("GROUP_COMMIT_INTERVAL", 0.5))
+        deadline = None
+        while True:
+            try:
+                request = self._requests.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                request = (COMMIT, ())
+            if request is None:
+                self._commit_group()
+                self.database.close()
+                self.journal.close()
+                break
+
+            handler, args = request
+            if handler == ARCHIVE:
+                if not self._group:
+                    deadline = time.monotonic() + group_interval
+                self._group.extend(args[0])
+                if len(self._group) < group_size:
+                    continue
+            deadline = None
+            try:
+                self._commit_group()
+                if handler not in (ARCHIVE, COMMIT):
+                    handler(*args)
+            except Exception as ex:
+                logger.exception(f"{ex.__class__.__name__}")
+
+    def _commit_group(self):
+        dumps, self._group = self._group, []
+        if not dumps:
+            return
+        started = time.perf_counter()
+        try:
+            self.database.insert_many(dumps)
+        except Exception as e:
+            # One bad dump shouldn't cost the whole group, retry them one by one.
+            logger.error(e)
+            archived = []
+            for dump in dumps:
+                try:
+                    self.database.insert(dump)
+                except Exception as e:
+                    logger.error(e)
+                else:
+                    archived.append(dump)
+        else:
+            archived = dumps
+        if self._kept is not None and any(dump.identity not in self._kept for dump in archived):
+            # An insert revives its row, the next lookup has to prune again.
+            self._kept = None
+        logger.debug(f"Group commit of {len(dumps)} dumps took {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.journal.append(ARCHIVED, archived)
+        self.journal.maybe_compact()
+        self.ArchivedSignal.emit(archived)
+
+    def stop(self):
+        self._requests.put(None)
+        self.wait()
+
+    def _put(self, request):
+        if self.failed:
+            logger.error("The dumps database isn't open, request dropped.")
+            return
+        self._requests.put(request)
+
+    def find_new_dumps(self, dumps):
+        self._put((self._find_new_dumps, (dumps,)))
+
+    def archive(self, dumps):
+        self._put((ARCHIVE, (dumps,)))
+
+    def load_crash_stats(self, since):
+        self._put((self._load_crash_stats, (since,)))
+
+    def queue_notification(self, dumps):
+        self._put((self._queue_notification, (dumps,)))
+
+    def _find_new_dumps(self, dumps):
+        started = time.perf_counter()
+        new_dumps = self.database.new_dumps(dumps)
+        logger.debug(f"Database lookup of {len(dumps)} dumps took {(time.perf_counter() - started) * 1000:.1f} ms")
+        # Sent, but the group commit that archives them hasn't run yet.
+        new_dumps = [dump for dump in new_dumps if not self.journal.was_sent(dump.identity)]
+        if new_dumps:
+            # Dumps still waiting in the outbox come back as new on every cycle, they are recorded once.
+            unrecorded = [dump for dump in new_dumps if dump.identity not in self._recorded]
+            if unrecorded:
+                self.database.record_detected(unrecorded)
+                self.journal.append(DETECTED, unrecorded)
+                self._recorded.update(dump.identity for dump in unrecorded)
+            self.NewDumpsSignal.emit(new_dumps)
+
+        kept = frozenset(item.identity for item in dumps)
+        self._recorded &= kept
+        if kept != self._kept:
+            removed = self.database.prune(kept, keep_names={item.file_name for item in dumps})
+            self._kept = kept
+            logger.info(f"Removed old dumps from database: {removed}")
+
+    def _load_crash_stats(self, since):
+        self.CrashStatsSignal.emit(self.database.crash_stats(by="day", since=since))
+
+    def _queue_notification(self, dumps):
+        # A lookup answered before an earlier batch reached the outbox may hand the same dumps to the GUI again,
+        # the outbox is only checked for them here, where the puts are serialized.
+        dumps = [dump for dump in dumps if dump.identity not in self.outbox]
+        if dumps:
+            self.outbox.put(dumps)
+            self.QueuedSignal.emit()
+
+
 class DumpChecker(QMainWindow):
-    def __init__(self, database):
+    def __init__(self):
         super(DumpChecker, self).__init__()
         self.setWindowIcon(QIcon(":/ico/icon.png"))
 
@@ -140,7 +469,8 @@ class DumpChecker(QMainWindow):
         self.tray_icon.show()
         self.tray_icon.activated.connect(self.tray_icon_activated)
 
-        self.database = database
+        # Opened by the database thread, nothing is sent before it's replayed.
+        self.journal = None
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.setWindowTitle(f"Dump checker {'(Administrator)' if is_admin() else ''}")
@@ -150,14 +480,51 @@ class DumpChecker(QMainWindow):
 
         self.configs = self.load_default_values()
 
+        self.outbox = Outbox(base_delay=float(self.configs["EMAIL"].get("RETRY_BASE_DELAY", 30)),
+                             max_delay=float(self.configs["EMAIL"].get("RETRY_MAX_DELAY", 3600)))
+        self.database_thread = DatabaseThread(self, configs=self.configs, outbox=self.outbox)
+        self.database_thread.NewDumpsSignal.connect(self.new_dumps_found)
+        self.database_thread.ArchivedSignal.connect(self.dumps_archived)
+        self.database_thread.CrashStatsSignal.connect(self.crash_stats_loaded)
+        self.database_thread.DatabaseErrorSignal.connect(self.database_error)
+        self.database_thread.ReadySignal.connect(self.database_ready)
+        self.database_thread.QueuedSignal.connect(self.drain_outbox)
+        self.database_thread.start()
+        self.refresh_crash_stats()
+
         self.check_thread = CheckThread(self, configs=self.configs)
         self.check_thread.CheckerThreadSignal.connect(self.send_email)
+        self.check_thread.finished.connect(self.check_thread_finished)
+        self._rescan_requested = False
+        self._run_requested = False
+
+        self.stabilization_timer = QTimer(self)
+        self.stabilization_timer.setSingleShot(True)
+        self.stabilization_timer.timeout.connect(lambda: self.run_check_thread(scan=self.check_thread.stabilizer.deferred > 0))
+
+        self.dump_watcher = DumpWatcher(self)
+        self.dump_watcher.DumpAppearedSignal.connect(self.dump_appeared)
 
+        auth = self.configs["UTILITY_CONFIGS"]["CHECKER_AUTH"]
+        self.smtp_pool = SmtpPool(auth["LOGIN"], auth["PASSWORD"], size=int(self.configs["EMAIL"].get("SMTP_CONNECTIONS", 2)))
         self.email_sender_stop_event = Event()
-        self.email_sender_thread = EmailSenderThread(self, configs=self.configs, stop_event=self.email_sender_stop_event)
+        self.email_sender_thread = EmailSenderThread(self, configs=self.configs, stop_event=self.email_sender_stop_event,
+                                                     journal=None, smtp_pool=self.smtp_pool, outbox=self.outbox)
         self.email_sender_thread.EmailSenderThreadSignal.connect(self.refresh_log_view_message)
         self.email_sender_thread.EmailSendSignal.connect(self.move_old_dumps)
         self.email_sender_thread.EmailSendError.connect(self.email_send_error)
+        self.email_sender_thread.finished.connect(self.email_sender_thread_finished)
+
+        email_configs = self.configs["EMAIL"]
+        self.coalescer = NotificationCoalescer(window=float(email_configs.get("COALESCE_WINDOW", 10)),
+                                               max_hold=float(email_configs.get("COALESCE_MAX_HOLD", 60)),
+                                               max_batch=int(email_configs.get("COALESCE_MAX_BATCH", 50)))
+        self.coalesce_timer = QTimer(self)
+        self.coalesce_timer.setSingleShot(True)
+        self.coalesce_timer.timeout.connect(self.flush_notifications)
+        self.outbox_timer = QTimer(self)
+        self.outbox_timer.setSingleShot(True)
+        self.outbox_timer.timeout.connect(self.drain_outbox)
 
         self.ui.pushButtonStart.clicked.connect(self.start_check)
         self.ui.pushButtonStop.clicked.connect(self.stop_check)
@@ -195,9 +562,28 @@ class DumpChecker(QMainWindow):
         self.check_timer = QTimer(self)
         self.check_timer.timeout.connect(self.check)
 
+        self.retention_thread = RetentionThread(self, configs=self.configs)
+        self.retention_timer = QTimer(self)
+        self.retention_timer.timeout.connect(self.run_retention_thread)
+        self.retention_timer.start(int(float(self.configs.get("DATABASE", {}).get("RETENTION_INTERVAL_HOURS", 6)) * 60 * 60 * 1000))
+        QTimer.singleShot(60 * 1000, self.run_retention_thread)
+
         if self.configs["UTILITY_CONFIGS"]["AUTORUN"]:
             self.start_check()
 
+    def database_ready(self, journal):
+        self.journal = self.email_sender_thread.journal = journal
+        self.drain_outbox()
+
+    def refresh_crash_stats(self):
+        self.database_thread.load_crash_stats(time.time() - 30 * 24 * 60 * 60)
+
+    def crash_stats_loaded(self, days):
+        today = arrow.now().format("YYYY-MM-DD")
+        today_count = sum(stats.count for stats in days if stats.key == today)
+        self.tray_icon.setToolTip(f"{UTILITY_REG_KEY}\nDumps today: {today_count}, "
+                                  f"last 30 days: {sum(stats.count for stats in days)}")
+
     def tray_icon_activated(self):
         if not self.isVisible():
             self.show()
@@ -237,6 +623,13 @@ class DumpChecker(QMainWindow):
         self.ui.textEditLogView.setText(f"{old_value}\n{arrow.now().format('DD-MM-YYYY HH:mm:ss'):=^70}\n{message}")
         self.ui.textEditLogView.verticalScrollBar().setValue(self.ui.textEditLogView.verticalScrollBar().maximum())
 
+    def database_error(self, error):
+        logger.error(error)
+        self.stop_check()
+        self.ui.pushButtonStart.setDisabled(True)
+        self.refresh_log_view_message(f"Database error: {error}. Checking is stopped.")
+        self._warning(f"{error}.\nDumps can't be checked, please fix the database and restart.", "Database error")
+
     def email_send_error(self, error):
         if isinstance(error, DailyEmailQuotaExceededError):
             logger.error(f"Limit exceeded: {error}")
@@ -322,6 +715,8 @@ class DumpChecker(QMainWindow):
             f.write(json.dumps(CONFIGS, indent=4))
 
         self.configs = load_and_get_configs()
+        if self.dump_watcher.is_watching:
+            self.start_dump_watcher()
         self.ui.pushButtonSave.setDisabled(True)
         self.ui.textEditLogView.setFocus()
 
@@ -352,10 +747,17 @@ class DumpChecker(QMainWindow):
         self.ui.textEditLogView.setFocus()
         self.check()
 
+    def check_database(self):
+        if self.database_thread.failed:
+            raise DatabaseUnavailableError("The dumps database isn't open.")
+
     def check(self):
         try:
+            self.check_database()
             self.check_recipient()
             self.check_path_exist(self.configs["LOGS_PATH"]["SERVER"], PathOf.SERVER)
+        except DatabaseUnavailableError as er:
+            logger.error(er)
         except RecipientNotSetError as er:
             logger.error(er)
             self.ui.lineEditAddNewRecipient.setFocus()
@@ -365,14 +767,70 @@ class DumpChecker(QMainWindow):
                 self.ui.lineEditLogPath.setFocus()
 
         else:
-            self.check_timer.start(self._wait_time() * 1000)
-            self.check_thread.start()
+            if self._watch_mode == "EVENTS" and (self.dump_watcher.is_watching or self.start_dump_watcher()) \
+                    and not self._log_roots[1]:
+                # A low-frequency poll stays on: it catches what the watcher missed, and the next check()
+                # restarts a watcher that died or falls back to the check timer.
+                safety_poll = self.configs.get("SCANNER", {}).get("SAFETY_POLL", 300)
+                if safety_poll:
+                    self.check_timer.start(int(float(safety_poll) * 1000))
+                else:
+                    self.check_timer.stop()
+            else:
+                self.check_timer.start(self._wait_time() * 1000)
             self.check_thread.CONFIGS = self.configs
+            self.run_check_thread()
             self.ui.pushButtonStart.setDisabled(True)
             self.ui.pushButtonStop.setEnabled(True)
 
+    @property
+    def _watch_mode(self):
+        return str(self.configs.get("SCANNER", {}).get("MODE", "EVENTS")).upper()
+
+    @property
+    def _log_roots(self):
+        return split_remote_roots(self.configs["LOGS_PATH"], self.configs.get("SCANNER", {}).get("REMOTE_ROOTS"))
+
+    def start_dump_watcher(self):
+        # Native notifications don't work on SMB/NFS mounts, remote roots are polled by the check timer.
+        local_roots, _ = self._log_roots
+        log_paths = [path for path in local_roots.values() if os.path.isdir(path)]
+        recursive = self.configs.get("SCANNER", {}).get("MAX_DEPTH") != 0
+        return self.dump_watcher.start(log_paths, recursive=recursive)
+
+    def run_check_thread(self, scan=True):
+        if self.check_thread.isRunning():
+            self._run_requested = True
+            self._rescan_requested = self._rescan_requested or scan
+        else:
+            self.check_thread.scan_requested = scan
+            self.check_thread.start()
+
+    def check_thread_finished(self):
+        if self._run_requested:
+            scan = self._rescan_requested
+            self._run_requested = self._rescan_requested = False
+            self.run_check_thread(scan=scan)
+            return
+
+        poll_in = self.check_thread.stabilizer.next_poll_in()
+        if poll_in is None and self.check_thread.stabilizer.deferred:
+            poll_in = 0
+        if poll_in is not None and (self.check_timer.isActive() or self.dump_watcher.is_watching):
+            self.stabilization_timer.start(math.ceil(poll_in * 1000))
+
+    def run_retention_thread(self):
+        if not self.retention_thread.isRunning():
+            self.retention_thread.start()
+
+    def dump_appeared(self, path):
+        logger.info(f"New dump detected: '{path}'")
+        self.run_check_thread()
+
     def stop_check(self):
         self.check_timer.stop()
+        self.stabilization_timer.stop()
+        self.dump_watcher.stop()
 
         self.ui.pushButtonStart.setEnabled(True)
         self.ui.pushButtonStop.setEnabled(False)
@@ -400,30 +858,43 @@ class DumpChecker(QMainWindow):
         self.ui.pushButtonSave.setEnabled(True)
 
     def send_email(self, dumps: [Dump]):
-        self.email_sender_stop_event.clear()
-        d = []
-        db_current_items = self.database.all_values
-
-        for dump in dumps:
-            if not self.database.check_exist(dump.file_name):
-                d.append(dump)
-        if not d:
+        self.database_thread.find_new_dumps(dumps)
+
+    def new_dumps_found(self, dumps):
+        if self.coalescer.add([dump for dump in dumps if dump.identity not in self.outbox]):
+            self.flush_notifications()
+
+    def flush_notifications(self):
+        while True:
+            d = self.coalescer.take()
+            if not d:
+                break
+            self.database_thread.queue_notification(d)
+        flush_in = self.coalescer.next_flush_in()
+        if flush_in is not None and not self.coalesce_timer.isActive():
+            self.coalesce_timer.start(math.ceil(flush_in * 1000))
+
+    def drain_outbox(self):
+        # One sender at a time, whatever is queued meanwhile is sent when it finishes.
+        if self.journal is None or self.email_sender_thread.isRunning():
+            return
+        if self.outbox.due():
+            self.email_sender_stop_event.clear()
+            self.email_sender_thread.configs = self.configs
+            self.email_sender_thread.start()
             return
-        self.email_sender_thread.dumps = d
-        self.email_sender_thread.configs = self.configs
-        self.email_sender_thread.start()
+        due_in = self.outbox.next_due_in()
+        if due_in is not None:
+            self.outbox_timer.start(math.ceil(due_in * 1000))
 
-        items_for_remove_from_db = set(db_current_items) - set([item.file_name for item in dumps])
-        logger.info(f"Remove old dump names: {items_for_remove_from_db}")
-        for item in items_for_remove_from_db:
-            self.database.delete(item)
+    def email_sender_thread_finished(self):
+        self.drain_outbox()
 
     def move_old_dumps(self, dumps):
-        for dump in dumps:
-            try:
-                self.database.insert(dump.file_name)
-            except Exception as e:
-                logger.error(e)
+        self.database_thread.archive(dumps)
+
+    def dumps_archived(self, archived):
+        self.refresh_crash_stats()
 
 
 if __name__ == '__main__':
@@ -442,9 +913,11 @@ if __name__ == '__main__':
         NamedTemporaryFile(prefix='lock01_dchecker', delete=True)
         try:
             app = QApplication([])
-            application = DumpChecker(DumpsDB())
+            application = DumpChecker()
             application.show()
             exit_code = app.exec_()
+            application.database_thread.stop()
+            application.smtp_pool.close()
         except Exception as e:
             exit_code = 1
             logger.exception(f"Fatal error. Exit code {exit_code}. {e}")
@@ -0,0 +1,6 @@
+from .dump import Dump, FileSize
+from .scanner import scan_dumps, newest_first, RootsScanner, DEFAULT_WORKERS
+from .incremental import IncrementalScanner
+from .remote import scan_remote, split_remote_roots, DEFAULT_REMOTE_CONCURRENCY
+from .stabilizer import WriteStabilizer
+from .snapshot import save_scan_state, load_scan_state
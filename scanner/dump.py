@@ -0,0 +1,84 @@
+import os
+
+import arrow
+
+from constants import DUMP_EXTENSION
+
+
+class FileSize:
+    __slots__ = ("size",)
+
+    def __init__(self, size):
+        self.size = size
+
+    @property
+    def megabytes(self) -> float:
+        return self.size / 1024 / 1024
+
+    @property
+    def kilobytes(self) -> float:
+        return self.size / 1024
+
+
+class Dump:
+    # Size and mtime are captured once by the scanner, nothing downstream has to stat the file again.
+    # The content hash and the archive path are filled in on the way out, when the dump is sent.
+    __slots__ = ("full_path", "file_name", "size", "mtime", "root", "dev", "ino", "content_hash", "archive_path")
+
+    def __init__(self, full_path, size, mtime, root=None, dev=0, ino=0):
+        assert full_path.lower().endswith(DUMP_EXTENSION), "Received file has extension different then '.dmp'"
+        self.full_path = full_path
+        self.file_name = os.path.basename(full_path)
+        self.size = size
+        self.mtime = mtime
+        self.root = root
+        self.dev = dev
+        self.ino = ino
+        self.content_hash = None
+        self.archive_path = None
+
+    @classmethod
+    def from_stat(cls, full_path, stat_result, root=None):
+        return cls(full_path, stat_result.st_size, stat_result.st_mtime, root=root,
+                   dev=stat_result.st_dev, ino=stat_result.st_ino)
+
+    @classmethod
+    def from_entry(cls, entry, root=None):
+        stat_result = entry.stat()
+        if not stat_result.st_ino:
+            # DirEntry on Windows leaves st_dev/st_ino zeroed, the identity needs the real file index.
+            stat_result = os.stat(entry.path)
+        return cls.from_stat(entry.path, stat_result, root=root)
+
+    @classmethod
+    def from_path(cls, full_path, root=None):
+        return cls.from_stat(full_path, os.stat(full_path), root=root)
+
+    @classmethod
+    def from_tuple(cls, values):
+        full_path, size, mtime, root, dev, ino = values
+        return cls(full_path, size, mtime, root=root, dev=dev, ino=ino)
+
+    def as_tuple(self):
+        return self.full_path, self.size, self.mtime, self.root, self.dev, self.ino
+
+    @property
+    def identity(self):
+        # Names can repeat across roots and a dump may be overwritten in place, the stat data can't.
+        # File systems without inode numbers fall back to the normalized path.
+        if self.ino:
+            file_id = f"{self.dev:x}:{self.ino:x}"
+        else:
+            file_id = os.path.normcase(os.path.abspath(self.full_path))
+        return f"{file_id}:{self.size:x}:{round(self.mtime * 1000000):x}"
+
+    @property
+    def file_size(self):
+        return FileSize(self.size)
+
+    @property
+    def creation_time(self):
+        return arrow.get(self.mtime)
+
+    def __repr__(self):
+        return f"Dump({self.full_path!r}, size={self.size}, mtime={self.mtime})"
@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+
+from .dump import Dump
+from .scanner import list_directory, dumps_from_entries, normalize_path
+
+logger = logging.getLogger("DumpChecker")
+
+# A directory modified this recently may still change within the same mtime tick (FAT keeps 2 seconds),
+# so its listing is not trusted on the next cycle.
+RACY_MTIME_WINDOW = 2.0
+
+
+class DirectoryState:
+    __slots__ = ("mtime_ns", "ino", "dumps", "subdirectories", "reliable")
+
+    def __init__(self, mtime_ns, ino, dumps, subdirectories, reliable):
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+        self.dumps = dumps
+        self.subdirectories = subdirectories
+        self.reliable = reliable
+
+    def matches(self, stat_result):
+        return self.reliable and self.mtime_ns == stat_result.st_mtime_ns and self.ino == stat_result.st_ino
+
+
+class IncrementalScanner:
+    # Remembers the mtime and inode of every directory it listed. A directory whose metadata didn't change
+    # since the previous cycle isn't listed again: its subdirectories are taken from the cache and only its
+    # dumps are stat'ed, a dump overwritten in place or still growing doesn't touch the directory mtime.
+    def __init__(self):
+        self._roots = {}
+        self.listed = 0
+        self.reused = 0
+
+    def scan(self, log_path, max_depth=None, root=None, exclude=()):
+        excluded = {normalize_path(path) for path in exclude}
+        previous = self._roots.get(root, {})
+        current = {}
+        now = time.time()
+        dumps = []
+
+        directories = [(log_path, 0)]
+        while directories:
+            directory, depth = directories.pop()
+            try:
+                stat_result = os.stat(directory)
+            except (FileNotFoundError, PermissionError, NotADirectoryError) as er:
+                if directory == log_path:
+                    raise
+                logger.warning(f"Skip directory '{directory}': {er}")
+                continue
+
+            state = previous.get(directory)
+            if state is None or not state.matches(stat_result):
+                try:
+                    state = self._list(directory, stat_result, root, now)
+                except (FileNotFoundError, PermissionError, NotADirectoryError) as er:
+                    if directory == log_path:
+                        raise
+                    logger.warning(f"Skip directory '{directory}': {er}")
+                    continue
+                self.listed += 1
+            else:
+                state.dumps = self._restat(state.dumps, root)
+                self.reused += 1
+
+            current[directory] = state
+            dumps.extend(state.dumps)
+            if max_depth is None or depth < max_depth:
+                directories.extend((subdirectory, depth + 1) for subdirectory in state.subdirectories
+                                   if normalize_path(subdirectory) not in excluded)
+
+        self._roots[root] = current
+        return dumps
+
+    def reset(self):
+        self._roots = {}
+
+    def export_state(self):
+        return {root: [(directory, state.mtime_ns, state.ino, state.reliable, tuple(state.subdirectories),
+                        tuple(dump.as_tuple() for dump in state.dumps))
+                       for directory, state in directories.items()]
+                for root, directories in self._roots.items()}
+
+    def restore_state(self, roots):
+        self._roots = {root: {directory: DirectoryState(mtime_ns, ino, [Dump.from_tuple(dump) for dump in dumps],
+                                                        list(subdirectories), reliable)
+                              for directory, mtime_ns, ino, reliable, subdirectories, dumps in directories}
+                       for root, directories in roots.items()}
+
+    @staticmethod
+    def _restat(dumps, root):
+        current = []
+        for dump in dumps:
+            try:
+                stat_result = os.stat(dump.full_path)
+            except (FileNotFoundError, PermissionError):
+                continue
+            if stat_result.st_size == dump.size and stat_result.st_mtime == dump.mtime:
+                current.append(dump)
+            else:
+                current.append(Dump.from_stat(dump.full_path, stat_result, root=root))
+        return current
+
+    @staticmethod
+    def _list(directory, stat_result, root, now):
+        dump_entries, subdirectories = list_directory(directory)
+        dumps = dumps_from_entries(dump_entries, root=root)
+        reliable = now - stat_result.st_mtime > RACY_MTIME_WINDOW
+        return DirectoryState(stat_result.st_mtime_ns, stat_result.st_ino, dumps, subdirectories, reliable)
@@ -0,0 +1,85 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+
+import psutil
+
+from .dump import Dump
+from .scanner import list_directory, normalize_path
+
+logger = logging.getLogger("DumpChecker")
+
+DEFAULT_REMOTE_CONCURRENCY = 8
+NETWORK_FILE_SYSTEMS = {"nfs", "nfs4", "cifs", "smbfs", "smb3", "afpfs", "9p", "fuse.sshfs", "davfs"}
+
+
+@lru_cache(maxsize=64)
+def is_remote_path(path):
+    if path.startswith(("\\\\", "//")):
+        return True
+
+    path = normalize_path(path)
+    mount = None
+    try:
+        partitions = psutil.disk_partitions(all=True)
+    except OSError:
+        return False
+    for partition in partitions:
+        mountpoint = normalize_path(partition.mountpoint)
+        if path == mountpoint or path.startswith(mountpoint.rstrip(os.sep) + os.sep):
+            if mount is None or len(mountpoint) > len(normalize_path(mount.mountpoint)):
+                mount = partition
+    if mount is None:
+        return False
+    return mount.fstype.lower() in NETWORK_FILE_SYSTEMS or "remote" in mount.opts.split(",")
+
+
+def split_remote_roots(roots: dict, remote_roots=None):
+    # remote_roots names the remote LOGS_PATH entries explicitly, None detects them by the mount they live on.
+    local, remote = {}, {}
+    for root, path in roots.items():
+        if root in remote_roots if remote_roots is not None else is_remote_path(path):
+            remote[root] = path
+        else:
+            local[root] = path
+    return local, remote
+
+
+def _stat_dump(entry, root):
+    return Dump.from_entry(entry, root=root)
+
+
+def scan_remote(log_path, max_depth=None, root=None, exclude=(), concurrency=DEFAULT_REMOTE_CONCURRENCY):
+    # On SMB/NFS every listing and stat is a network round trip, so up to `concurrency` of them are kept in
+    # flight at once instead of walking the tree one request after another.
+    excluded = {normalize_path(path) for path in exclude}
+    dumps = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="remote-scanner") as pool:
+        pending = {pool.submit(list_directory, log_path): (log_path, 0)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory, depth = pending.pop(future)
+                if directory is None:
+                    try:
+                        dumps.append(future.result())
+                    except FileNotFoundError:
+                        pass
+                    continue
+
+                try:
+                    dump_entries, subdirectories = future.result()
+                except (FileNotFoundError, PermissionError, NotADirectoryError) as er:
+                    if directory == log_path:
+                        raise
+                    logger.warning(f"Skip directory '{directory}': {er}")
+                    continue
+
+                for entry in dump_entries:
+                    pending[pool.submit(_stat_dump, entry, root)] = (None, depth)
+                if max_depth is None or depth < max_depth:
+                    for subdirectory in subdirectories:
+                        if normalize_path(subdirectory) not in excluded:
+                            pending[pool.submit(list_directory, subdirectory)] = (subdirectory, depth + 1)
+    return dumps
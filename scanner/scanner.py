@@ -0,0 +1,171 @@
+import heapq
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from constants import DUMP_EXTENSION
+from .dump import Dump
+
+logger = logging.getLogger("DumpChecker")
+
+DEFAULT_WORKERS = 4
+QUEUED_POLL_INTERVAL = 0.1
+
+
+def _is_dump_name(name):
+    return name[-len(DUMP_EXTENSION):].lower() == DUMP_EXTENSION
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def list_directory(directory):
+    # One scandir pass shared by every scanner: DirEntry objects of the dumps (their stat comes with the
+    # listing on Windows) and paths of the subdirectories. Symlinked directories aren't followed.
+    dump_entries = []
+    subdirectories = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if _is_dump_name(entry.name):
+                    if entry.is_file():
+                        dump_entries.append(entry)
+                elif entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+            except FileNotFoundError:
+                continue
+    return dump_entries, subdirectories
+
+
+def dumps_from_entries(dump_entries, root=None):
+    dumps = []
+    for entry in dump_entries:
+        try:
+            dumps.append(Dump.from_entry(entry, root=root))
+        except FileNotFoundError:
+            continue
+    return dumps
+
+
+def scan_dumps(log_path, max_depth=None, root=None, exclude=()):
+    # One pass over every directory: the extension is checked on the entry name and the only stat per dump
+    # comes from DirEntry (on Windows it is filled in by the directory listing itself, without a syscall).
+    # max_depth=0 scans only log_path itself, None walks the whole tree. Symlinked directories aren't followed.
+    excluded = {normalize_path(path) for path in exclude}
+    dumps = []
+    directories = [(log_path, 0)]
+    while directories:
+        directory, depth = directories.pop()
+        try:
+            dump_entries, subdirectories = list_directory(directory)
+        except (FileNotFoundError, PermissionError, NotADirectoryError) as er:
+            if directory == log_path:
+                raise
+            logger.warning(f"Skip directory '{directory}': {er}")
+            continue
+
+        dumps.extend(dumps_from_entries(dump_entries, root=root))
+        if max_depth is None or depth < max_depth:
+            directories.extend((subdirectory, depth + 1) for subdirectory in subdirectories
+                               if normalize_path(subdirectory) not in excluded)
+    return dumps
+
+
+def newest_first(dumps, limit=None):
+    # With a limit only `limit` dumps are kept in a heap while the rest of the input streams through,
+    # so a storm of thousands of dumps costs O(n log limit) and no full sorted copy.
+    if limit is None:
+        yield from sorted(dumps, key=lambda dump: dump.mtime, reverse=True)
+    else:
+        yield from heapq.nlargest(limit, dumps, key=lambda dump: dump.mtime)
+
+
+def _root_depth(max_depth, root):
+    if isinstance(max_depth, dict):
+        return max_depth.get(root)
+    return max_depth
+
+
+class RootsScanner:
+    # Every root is scanned on its own thread of a bounded pool (scandir/stat release the GIL), so a cycle
+    # takes as long as the slowest root. A root that fails or doesn't finish within `timeout` seconds of its
+    # scan starting reports its last known dumps, and isn't submitted again while its previous scan is still
+    # stuck. A late scan's result is kept for the next cycle, so a root that is always slow is still reported.
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scanner")
+        self._running = {}
+        self._started = {}
+        self._last_dumps = {}
+
+    def _run(self, root_scan, root, *args):
+        self._started[root] = time.monotonic()
+        return root_scan(*args)
+
+    def _collect(self, root, path, future):
+        try:
+            self._last_dumps[root] = future.result()
+        except OSError as er:
+            logger.error(f"Can't scan {root} logs '{path}': {er}")
+        del self._running[root]
+
+    def scan(self, roots: dict, max_depth=None, exclude=(), scan=scan_dumps, remote_scan=None, remote_roots=(),
+             timeout=None):
+        futures = {}
+        for root, path in roots.items():
+            running = self._running.get(root)
+            if running is not None and not running.done():
+                logger.warning(f"Previous scan of {root} logs '{path}' is still running, reuse its last result.")
+                continue
+            if running is not None:
+                self._collect(root, path, running)
+            root_scan = remote_scan if remote_scan is not None and root in remote_roots else scan
+            self._started.pop(root, None)
+            futures[root] = self._running[root] = self._pool.submit(self._run, root_scan, root, path,
+                                                                    _root_depth(max_depth, root), root, exclude)
+
+        # Each root gets `timeout` seconds from the moment its scan starts. Roots queued behind busy workers
+        # wait their turn, but no longer than it takes every queued scan to use up its own timeout.
+        queued_deadline = None
+        if timeout is not None:
+            waves = -(-len(self._running) // self.workers)
+            queued_deadline = time.monotonic() + timeout * waves
+        pending = dict(futures)
+        while pending:
+            done, _ = wait(pending.values(), timeout=self._wait_time(pending, timeout, queued_deadline),
+                           return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for root, future in list(pending.items()):
+                if future in done:
+                    self._collect(root, roots[root], future)
+                elif timeout is not None and now >= (self._started[root] + timeout if root in self._started
+                                                     else queued_deadline):
+                    logger.error(f"Scan of {root} logs '{roots[root]}' didn't finish in {timeout}s.")
+                else:
+                    continue
+                del pending[root]
+
+        # Nested roots (e.g. a module log tree inside the server one) must not report a dump twice.
+        dumps = []
+        seen_paths = set()
+        for root in roots:
+            for dump in self._last_dumps.get(root, ()):
+                key = normalize_path(dump.full_path)
+                if key not in seen_paths:
+                    seen_paths.add(key)
+                    dumps.append(dump)
+        return dumps
+
+    def _wait_time(self, pending, timeout, queued_deadline):
+        if timeout is None:
+            return None
+        deadlines = [self._started[root] + timeout for root in pending if root in self._started]
+        if len(deadlines) < len(pending):
+            # A queued root starts when some other scan ends, which may not be one of ours: look again soon.
+            deadlines.append(min(queued_deadline, time.monotonic() + QUEUED_POLL_INTERVAL))
+        return max(min(deadlines) - time.monotonic(), 0)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
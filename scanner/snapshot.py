@@ -0,0 +1,45 @@
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger("DumpChecker")
+
+SCAN_STATE_PATH = os.path.join(os.environ["TEMP"], "dump_checker_scan.idx")
+SCAN_STATE_VERSION = 2
+
+
+def save_scan_state(scanner, stabilizer, path=SCAN_STATE_PATH):
+    # JSON, the index lives in TEMP and loading it mustn't be able to run code. The roots go as pairs: a root
+    # may be None, which a JSON object key can't hold.
+    payload = json.dumps([SCAN_STATE_VERSION, list(scanner.export_state().items()), stabilizer.export_state()],
+                         separators=(",", ":")).encode("utf-8")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(zlib.compress(payload, 1))
+    os.replace(temp_path, path)
+
+
+def load_scan_state(scanner, stabilizer, path=SCAN_STATE_PATH):
+    try:
+        with open(path, "rb") as f:
+            version, roots, stable = json.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, TypeError, zlib.error) as er:
+        logger.warning(f"Can't load scan state '{path}': {er}. Start with a cold scan.")
+        return False
+
+    if version != SCAN_STATE_VERSION:
+        logger.info(f"Scan state '{path}' has version {version}, expected {SCAN_STATE_VERSION}. Start with a cold scan.")
+        return False
+
+    try:
+        scanner.restore_state(dict(roots))
+        stabilizer.restore_state(stable)
+    except (ValueError, TypeError, AssertionError) as er:
+        scanner.reset()
+        stabilizer.restore_state([])
+        logger.warning(f"Can't load scan state '{path}': {er}. Start with a cold scan.")
+        return False
+    return True
@@ -0,0 +1,111 @@
+import os
+import time
+
+from .dump import Dump
+from .scanner import newest_first
+
+
+class _Candidate:
+    __slots__ = ("dump", "size", "mtime", "last_change", "interval", "next_check")
+
+    def __init__(self, dump, interval):
+        self.dump = dump
+        self.size = dump.size
+        self.mtime = dump.mtime
+        self.last_change = dump.mtime
+        self.interval = interval
+        self.next_check = time.monotonic() + interval
+
+
+class WriteStabilizer:
+    # Holds back dumps that are still being written. A new dump becomes a candidate and is re-stat'ed with
+    # a backing off interval; it's released once neither its size nor its mtime changed for quiet_period
+    # seconds. The mtime isn't trusted alone: NTFS may update it only when the writer closes the file.
+    def __init__(self, quiet_period=5.0, min_interval=0.5, max_interval=30.0, max_pending=None):
+        self.quiet_period = quiet_period
+        self.max_pending = max_pending
+        self.deferred = 0
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._candidates = {}
+        self._stable = {}
+
+    @property
+    def stable_dumps(self):
+        return list(newest_first(dump for _, dump in self._stable.values()))
+
+    @property
+    def pending(self):
+        return len(self._candidates)
+
+    def export_state(self):
+        return [(scanned, dump.as_tuple()) for scanned, dump in self._stable.values()]
+
+    def restore_state(self, stable):
+        self._stable = {}
+        for scanned, values in stable:
+            dump = Dump.from_tuple(values)
+            self._stable[dump.full_path] = (tuple(scanned), dump)
+
+    def update(self, dumps):
+        # Takes the result of a full scan: released dumps stay stable while the scanner reports them as it did
+        # when they were picked up, new or changed ones become candidates, vanished candidates are forgotten.
+        # At most max_pending candidates are tracked, the newest first; the rest wait for the next scan.
+        stable = {}
+        candidates = {}
+        new_dumps = []
+        for dump in dumps:
+            path = dump.full_path
+            known = self._stable.get(path)
+            if known is not None and (dump.size, dump.mtime) in (known[0], (known[1].size, known[1].mtime)):
+                stable[path] = known
+            elif path in self._candidates:
+                candidates[path] = self._candidates[path]
+            else:
+                new_dumps.append(dump)
+
+        free_slots = None if self.max_pending is None else max(self.max_pending - len(candidates), 0)
+        admitted = 0
+        for dump in newest_first(new_dumps, free_slots):
+            candidates[dump.full_path] = _Candidate(dump, interval=self.min_interval)
+            admitted += 1
+        self.deferred = len(new_dumps) - admitted
+        self._stable = stable
+        self._candidates = candidates
+
+    def poll(self):
+        released = []
+        now = time.time()
+        monotonic_now = time.monotonic()
+        for path, candidate in list(self._candidates.items()):
+            if candidate.next_check > monotonic_now:
+                continue
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                del self._candidates[path]
+                continue
+
+            if stat_result.st_size != candidate.size or stat_result.st_mtime != candidate.mtime:
+                candidate.size = stat_result.st_size
+                candidate.mtime = stat_result.st_mtime
+                candidate.last_change = now
+                candidate.interval = self.min_interval
+                candidate.next_check = monotonic_now + candidate.interval
+                continue
+
+            if now - candidate.last_change >= self.quiet_period and now - stat_result.st_mtime >= self.quiet_period:
+                del self._candidates[path]
+                dump = Dump.from_stat(path, stat_result, root=candidate.dump.root)
+                self._stable[path] = ((candidate.dump.size, candidate.dump.mtime), dump)
+                released.append(dump)
+            else:
+                candidate.interval = min(candidate.interval * 2, self.max_interval)
+                quiet_left = self.quiet_period - (now - candidate.last_change)
+                candidate.next_check = monotonic_now + max(min(candidate.interval, quiet_left), self.min_interval)
+        return released
+
+    def next_poll_in(self):
+        if not self._candidates:
+            return None
+        return max(min(candidate.next_check for candidate in self._candidates.values()) - time.monotonic(), 0)
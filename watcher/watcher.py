@@ -0,0 +1,73 @@
+import logging
+
+from PyQt5 import QtCore
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+from constants import DUMP_EXTENSION
+
+logger = logging.getLogger("DumpChecker")
+
+
+class _DumpEventHandler(FileSystemEventHandler):
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def on_created(self, event):
+        self._dispatch_dump(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self._dispatch_dump(event.dest_path, event.is_directory)
+
+    def _dispatch_dump(self, path, is_directory):
+        if not is_directory and path.lower().endswith(DUMP_EXTENSION):
+            self.callback(path)
+
+
+class DumpWatcher(QtCore.QObject):
+    DumpAppearedSignal = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._observer = None
+
+    @staticmethod
+    def is_available():
+        return Observer is not None
+
+    @property
+    def is_watching(self):
+        return self._observer is not None and self._observer.is_alive()
+
+    def start(self, paths, recursive=False) -> bool:
+        self.stop()
+        if not self.is_available():
+            logger.warning("Package 'watchdog' is not installed, fall back to polling.")
+            return False
+
+        observer = Observer()
+        handler = _DumpEventHandler(self.DumpAppearedSignal.emit)
+        try:
+            for path in paths:
+                observer.schedule(handler, path, recursive=recursive)
+            observer.start()
+        except (OSError, RuntimeError) as er:
+            logger.warning(f"Can't watch {paths}: {er}. Fall back to polling.")
+            return False
+
+        self._observer = observer
+        logger.info(f"Watching {paths} for new dumps.")
+        return True
+
+    def stop(self):
+        if self._observer is None:
+            return
+        self._observer.stop()
+        self._observer.join()
+        self._observer = None